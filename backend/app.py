@@ -5,12 +5,36 @@ This Flask application provides endpoints for executing recommendation algorithm
 including XGBoost, Random Forests, and traditional collaborative filtering methods.
 """
 
-from flask import Flask, request, jsonify
+import multiprocessing
+import os
+
+# Threads per compare worker; workers x threads stays within the core count
+COMPARE_WORKER_THREADS = 2
+
+# Native thread pools are sized from the environment when numpy/xgboost are
+# imported, so this must run first.
+if multiprocessing.current_process().name != 'MainProcess':
+    # A compare worker spawned by _get_compare_pool is importing this module
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(COMPARE_WORKER_THREADS)
+else:
+    # One OpenMP thread per process: under gunicorn every worker is its own
+    # process, so a full thread pool per worker oversubscribes the cores.
+    # Override to speed up training when running a single process.
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+from flask import Flask, Response, request
 from flask_cors import CORS
+from flask_compress import Compress
 import numpy as np
 import pandas as pd
+import orjson
 from typing import Dict, Any, List
 import logging
+import uuid
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Import model implementations
 from models.xgboost_recommender import XGBoostRecommender
@@ -19,6 +43,8 @@ from models.matrix_factorization import MatrixFactorization
 from models.collaborative_filtering import CollaborativeFiltering
 from utils.data_loader import DataLoader
 from utils.metrics import RecommenderMetrics
+from utils.pipeline_store import PipelineStore
+from utils.prediction_batcher import PredictionBatcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,14 +54,195 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
 
-# Store active models and data
-active_pipelines = {}
+# Compress large JSON replies (top-K lists, comparison grids); level 1 keeps
+# the CPU cost low and small replies such as /health are sent as-is
+app.config['COMPRESS_ALGORITHM'] = ['zstd', 'br', 'gzip']
+app.config['COMPRESS_LEVEL'] = 1
+app.config['COMPRESS_BR_LEVEL'] = 1
+app.config['COMPRESS_ZSTD_LEVEL'] = 1
+app.config['COMPRESS_MIN_SIZE'] = 4096
+Compress(app)
+
+class ORJSONResponse(Response):
+    """JSON response serialized with orjson"""
+    default_mimetype = 'application/json'
+
+
+def json_response(payload: Dict[str, Any], status: int = 200) -> ORJSONResponse:
+    """
+    Serialize a payload with orjson
+
+    Faster than jsonify on large prediction/comparison payloads and
+    serializes numpy arrays and scalars natively.
+    """
+    body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return ORJSONResponse(body, status=status)
+
+
+def df_from_columns(user_ids, item_ids) -> pd.DataFrame:
+    """Build a (user_id, item_id) frame from parallel id arrays"""
+    return pd.DataFrame({
+        'user_id': np.asarray(user_ids, dtype=np.int32),
+        'item_id': np.asarray(item_ids, dtype=np.int32)
+    })
+
+
+def df_from_records(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Build a (user_id, item_id) frame from a list of {user_id, item_id} records
+
+    Extracts each column with np.fromiter instead of letting pandas
+    assemble the frame row by row from dicts.
+    """
+    n = len(records)
+    return df_from_columns(
+        np.fromiter((r['user_id'] for r in records), dtype=np.int32, count=n),
+        np.fromiter((r['item_id'] for r in records), dtype=np.int32, count=n)
+    )
+
+
+# Store active models and data (hot pipelines in memory, all pipelines on disk,
+# deleted after an hour without use)
+active_pipelines = PipelineStore(ttl=3600)
+
+
+def _missing_pipeline_response(pipeline_id: str, status: int = 400) -> ORJSONResponse:
+    """Error response for a pipeline_id that is unknown or has expired"""
+    if isinstance(pipeline_id, str) and active_pipelines.is_expired(pipeline_id):
+        return json_response({'success': False, 'error': 'Pipeline expired, reload the data'}, 404)
+    return json_response({'success': False, 'error': 'Invalid pipeline_id'}, status)
+
+# Model type names accepted by the API
+MODEL_REGISTRY = {
+    'xgboost': XGBoostRecommender,
+    'random_forest': RandomForestRecommender,
+    'matrix_factorization': MatrixFactorization,
+    'collaborative_filtering': CollaborativeFiltering
+}
+
+# Concurrent predict requests for tree models are coalesced into one call.
+# Only useful when a worker serves several requests at once (threaded or
+# async workers); single-threaded sync workers never have two in flight,
+# so batching is off unless MAMMOTH_BATCH_PREDICTIONS=1 (set by
+# gunicorn.conf.py when MAMMOTH_THREADS > 1)
+BATCHED_MODEL_TYPES = {'xgboost', 'random_forest'}
+prediction_batcher = (
+    PredictionBatcher() if os.environ.get('MAMMOTH_BATCH_PREDICTIONS') == '1' else None
+)
+
+
+def _single_thread_inference(model) -> None:
+    """
+    Restrict a fitted tree model to one thread for prediction
+
+    XGBoost and scikit-learn forests grab every core per predict call by
+    default, which thrashes when several workers serve requests at once.
+    Training keeps the library defaults.
+    """
+    if isinstance(model, XGBoostRecommender) and model.is_fitted:
+        model.model.set_param({'nthread': 1})
+    elif isinstance(model, RandomForestRecommender) and model.is_fitted:
+        model.model.set_params(n_jobs=1)
+
+
+# Compare processes shared by all requests. Under gunicorn every worker is
+# already one process per core, so gunicorn.conf.py sets this to 1 and
+# configurations train serially inside the worker instead
+COMPARE_WORKERS = int(os.environ.get(
+    'MAMMOTH_COMPARE_WORKERS', max(1, (os.cpu_count() or 2) // COMPARE_WORKER_THREADS)
+))
+_compare_pool = None
+_compare_pool_lock = threading.Lock()
+
+
+def _get_compare_pool() -> ProcessPoolExecutor:
+    """
+    The module-level compare pool, started on first use
+
+    Workers are spawned, not forked: forking this threaded server could copy
+    locks held by other threads (batcher, pipeline store, logging) and an
+    OpenMP runtime that has already started its threads, which can hang
+    the child.
+    """
+    global _compare_pool
+    with _compare_pool_lock:
+        if _compare_pool is None:
+            _compare_pool = ProcessPoolExecutor(
+                max_workers=COMPARE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_compare_worker
+            )
+        return _compare_pool
+
+
+def _reset_compare_pool() -> None:
+    """Drop a pool whose worker died so the next request starts a fresh one"""
+    global _compare_pool
+    with _compare_pool_lock:
+        if _compare_pool is not None:
+            _compare_pool.shutdown(wait=False, cancel_futures=True)
+            _compare_pool = None
+
+
+def _init_compare_worker() -> None:
+    """Cap native thread pools in a compare worker process
+
+    The environment set at import already sized them; this also covers
+    libraries that ignore those variables.
+    """
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=COMPARE_WORKER_THREADS)
+
+
+def _train_and_eval(
+    train_data: pd.DataFrame,
+    test_data: pd.DataFrame,
+    model_type: str,
+    config: Dict[str, Any],
+    metrics_to_compute: List[str]
+) -> Dict[str, Any]:
+    """Train one model configuration and compute its metrics (runs in a worker process)"""
+    model = MODEL_REGISTRY[model_type](**config)
+    model.fit(train_data)
+    _single_thread_inference(model)
+
+    # Evaluate
+    metrics_calc = RecommenderMetrics()
+    model_metrics = {}
+
+    test_predictions = model.predict_ratings(test_data)
+
+    # One batched top-K prediction shared by every ranking metric
+    ranking_ks = [int(metric_name.split('@')[1]) for metric_name in metrics_to_compute if '@' in metric_name]
+    user_topk = metrics_calc.predict_top_k(test_data, model, max(ranking_ks)) if ranking_ks else None
+
+    for metric_name in metrics_to_compute:
+        if '@' in metric_name:
+            metric, k = metric_name.split('@')
+            model_metrics[metric_name] = metrics_calc.calculate_ranking_metric(
+                test_data,
+                model,
+                metric,
+                int(k),
+                precomputed_topk=user_topk
+            )
+        else:
+            model_metrics[metric_name] = metrics_calc.calculate_rating_metric(
+                test_data['rating'].to_numpy(),
+                test_predictions,
+                metric_name
+            )
+
+    return {
+        'model_type': model_type,
+        'config': config,
+        'metrics': model_metrics
+    }
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'mammoth-backend'}), 200
+    return json_response({'status': 'healthy', 'service': 'mammoth-backend'}, 200)
 
 
 @app.route('/api/data/load', methods=['POST'])
@@ -70,29 +277,32 @@ def load_data():
         train, test = loader.train_test_split(dataset, split_ratio)
 
         # Store dataset
-        pipeline_id = f"pipeline_{len(active_pipelines) + 1}"
+        pipeline_id = f"pipeline_{uuid.uuid4().hex}"
+        n_users = dataset['user_id'].unique().size
+        n_items = dataset['item_id'].unique().size
+        n_interactions = len(dataset)
         active_pipelines[pipeline_id] = {
             'train': train,
             'test': test,
             'metadata': {
-                'n_users': dataset['user_id'].nunique(),
-                'n_items': dataset['item_id'].nunique(),
-                'n_interactions': len(dataset),
-                'sparsity': 1 - (len(dataset) / (dataset['user_id'].nunique() * dataset['item_id'].nunique()))
+                'n_users': n_users,
+                'n_items': n_items,
+                'n_interactions': n_interactions,
+                'sparsity': 1 - (n_interactions / (n_users * n_items))
             }
         }
 
-        return jsonify({
+        return json_response({
             'success': True,
             'pipeline_id': pipeline_id,
             'metadata': active_pipelines[pipeline_id]['metadata'],
             'train_size': len(train),
             'test_size': len(test)
-        }), 200
+        }, 200)
 
     except Exception as e:
         logger.error(f"Error loading data: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 
 @app.route('/api/models/train', methods=['POST'])
@@ -116,40 +326,37 @@ def train_model():
         config = data.get('config', {})
 
         if pipeline_id not in active_pipelines:
-            return jsonify({'success': False, 'error': 'Invalid pipeline_id'}), 400
+            return _missing_pipeline_response(pipeline_id)
 
         train_data = active_pipelines[pipeline_id]['train']
 
         # Initialize and train model
-        if model_type == 'xgboost':
-            model = XGBoostRecommender(**config)
-        elif model_type == 'random_forest':
-            model = RandomForestRecommender(**config)
-        elif model_type == 'matrix_factorization':
-            model = MatrixFactorization(**config)
-        elif model_type == 'collaborative_filtering':
-            model = CollaborativeFiltering(**config)
-        else:
-            return jsonify({'success': False, 'error': f'Unknown model type: {model_type}'}), 400
+        model_cls = MODEL_REGISTRY.get(model_type)
+        if model_cls is None:
+            return json_response({'success': False, 'error': f'Unknown model type: {model_type}'}, 400)
+        model = model_cls(**config)
 
         # Train the model
         training_history = model.fit(train_data)
 
         # Store trained model
-        active_pipelines[pipeline_id]['model'] = model
-        active_pipelines[pipeline_id]['model_type'] = model_type
-        active_pipelines[pipeline_id]['training_history'] = training_history
-
-        return jsonify({
+        active_pipelines.update(
+            pipeline_id,
+            model=model,
+            model_type=model_type,
+            training_history=training_history
+        )
+
+        return json_response({
             'success': True,
             'pipeline_id': pipeline_id,
             'model_type': model_type,
             'training_history': training_history
-        }), 200
+        }, 200)
 
     except Exception as e:
         logger.error(f"Error training model: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 
 @app.route('/api/models/predict', methods=['POST'])
@@ -163,32 +370,65 @@ def predict():
         "user_ids": [1, 2, 3],
         "top_k": 10
     }
+
+    To score specific user-item pairs instead of returning top-K lists,
+    send parallel arrays (preferred) or records:
+    {
+        "pipeline_id": "pipeline_1",
+        "user_ids": [1, 2, 3],
+        "item_ids": [10, 20, 30]
+    }
+    {
+        "pipeline_id": "pipeline_1",
+        "pairs": [{"user_id": 1, "item_id": 10}, ...]
+    }
     """
     try:
         data = request.json
         pipeline_id = data.get('pipeline_id')
         user_ids = data.get('user_ids')
+        item_ids = data.get('item_ids')
+        pairs = data.get('pairs')
         top_k = data.get('top_k', 10)
 
         if pipeline_id not in active_pipelines:
-            return jsonify({'success': False, 'error': 'Invalid pipeline_id'}), 400
+            return _missing_pipeline_response(pipeline_id)
 
         if 'model' not in active_pipelines[pipeline_id]:
-            return jsonify({'success': False, 'error': 'No trained model found'}), 400
+            return json_response({'success': False, 'error': 'No trained model found'}, 400)
 
         model = active_pipelines[pipeline_id]['model']
+        _single_thread_inference(model)
+
+        # Score explicit user-item pairs
+        if item_ids is not None or pairs is not None:
+            if item_ids is not None:
+                if user_ids is None or len(user_ids) != len(item_ids):
+                    return json_response({'success': False, 'error': 'user_ids and item_ids must have the same length'}, 400)
+                candidates = df_from_columns(user_ids, item_ids)
+            else:
+                candidates = df_from_records(pairs)
+
+            return json_response({
+                'success': True,
+                'ratings': model.predict_ratings(candidates)
+            }, 200)
 
         # Generate predictions
-        predictions = model.predict(user_ids, top_k=top_k)
+        if (prediction_batcher is not None
+                and active_pipelines[pipeline_id].get('model_type') in BATCHED_MODEL_TYPES):
+            predictions = prediction_batcher.predict(model, user_ids, top_k)
+        else:
+            predictions = model.predict(user_ids, top_k=top_k)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'predictions': predictions
-        }), 200
+        }, 200)
 
     except Exception as e:
         logger.error(f"Error generating predictions: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 
 @app.route('/api/models/evaluate', methods=['POST'])
@@ -210,13 +450,14 @@ def evaluate_model():
         k_values = data.get('k_values', [5, 10, 20])
 
         if pipeline_id not in active_pipelines:
-            return jsonify({'success': False, 'error': 'Invalid pipeline_id'}), 400
+            return _missing_pipeline_response(pipeline_id)
 
         if 'model' not in active_pipelines[pipeline_id]:
-            return jsonify({'success': False, 'error': 'No trained model found'}), 400
+            return json_response({'success': False, 'error': 'No trained model found'}, 400)
 
         model = active_pipelines[pipeline_id]['model']
         test_data = active_pipelines[pipeline_id]['test']
+        _single_thread_inference(model)
 
         # Generate predictions on test set
         test_predictions = model.predict_ratings(test_data)
@@ -225,10 +466,15 @@ def evaluate_model():
         metrics_calc = RecommenderMetrics()
         results = {}
 
+        # One batched top-K prediction shared by every ranking metric and cutoff
+        user_topk = None
+        if k_values and any(m in ['precision', 'recall', 'ndcg', 'map'] for m in metric_names):
+            user_topk = metrics_calc.predict_top_k(test_data, model, max(k_values))
+
         for metric_name in metric_names:
             if metric_name in ['rmse', 'mae']:
                 results[metric_name] = metrics_calc.calculate_rating_metric(
-                    test_data['rating'].values,
+                    test_data['rating'].to_numpy(),
                     test_predictions,
                     metric_name
                 )
@@ -238,20 +484,21 @@ def evaluate_model():
                         test_data,
                         model,
                         metric_name,
-                        k
+                        k,
+                        precomputed_topk=user_topk
                     )
 
         # Store evaluation results
-        active_pipelines[pipeline_id]['evaluation'] = results
+        active_pipelines.update(pipeline_id, evaluation=results)
 
-        return jsonify({
+        return json_response({
             'success': True,
             'metrics': results
-        }), 200
+        }, 200)
 
     except Exception as e:
         logger.error(f"Error evaluating model: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 
 @app.route('/api/models/compare', methods=['POST'])
@@ -277,74 +524,53 @@ def compare_models():
         metrics_to_compute = data.get('metrics', ['rmse', 'precision@10'])
 
         if pipeline_id not in active_pipelines:
-            return jsonify({'success': False, 'error': 'Invalid pipeline_id'}), 400
+            return _missing_pipeline_response(pipeline_id)
 
         train_data = active_pipelines[pipeline_id]['train']
         test_data = active_pipelines[pipeline_id]['test']
 
-        comparison_results = []
-
-        for model_config in model_configs:
-            model_type = model_config['type']
-            config = model_config.get('config', {})
-
-            # Train model
-            if model_type == 'xgboost':
-                model = XGBoostRecommender(**config)
-            elif model_type == 'random_forest':
-                model = RandomForestRecommender(**config)
-            elif model_type == 'matrix_factorization':
-                model = MatrixFactorization(**config)
-            elif model_type == 'collaborative_filtering':
-                model = CollaborativeFiltering(**config)
-            else:
-                continue
-
-            model.fit(train_data)
-
-            # Evaluate
-            metrics_calc = RecommenderMetrics()
-            model_metrics = {}
-
-            test_predictions = model.predict_ratings(test_data)
-
-            for metric_name in metrics_to_compute:
-                if '@' in metric_name:
-                    metric, k = metric_name.split('@')
-                    model_metrics[metric_name] = metrics_calc.calculate_ranking_metric(
-                        test_data,
-                        model,
-                        metric,
-                        int(k)
-                    )
-                else:
-                    model_metrics[metric_name] = metrics_calc.calculate_rating_metric(
-                        test_data['rating'].values,
-                        test_predictions,
-                        metric_name
-                    )
-
-            comparison_results.append({
-                'model_type': model_type,
-                'config': config,
-                'metrics': model_metrics
-            })
+        # Unknown model types are skipped
+        model_configs = [model_config for model_config in model_configs
+                         if model_config['type'] in MODEL_REGISTRY]
+        model_types = [model_config['type'] for model_config in model_configs]
+        configs = [model_config.get('config', {}) for model_config in model_configs]
+        n = len(model_configs)
+
+        if n > 1 and COMPARE_WORKERS > 1:
+            # Configurations are independent, so train them in the shared process pool
+            try:
+                comparison_results = list(_get_compare_pool().map(
+                    _train_and_eval,
+                    [train_data] * n,
+                    [test_data] * n,
+                    model_types,
+                    configs,
+                    [metrics_to_compute] * n
+                ))
+            except BrokenProcessPool:
+                _reset_compare_pool()
+                raise
+        else:
+            comparison_results = [
+                _train_and_eval(train_data, test_data, model_type, config, metrics_to_compute)
+                for model_type, config in zip(model_types, configs)
+            ]
 
-        return jsonify({
+        return json_response({
             'success': True,
             'comparison': comparison_results
-        }), 200
+        }, 200)
 
     except Exception as e:
         logger.error(f"Error comparing models: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 400
+        return json_response({'success': False, 'error': str(e)}, 400)
 
 
 @app.route('/api/pipeline/info/<pipeline_id>', methods=['GET'])
 def get_pipeline_info(pipeline_id):
     """Get information about a pipeline"""
     if pipeline_id not in active_pipelines:
-        return jsonify({'success': False, 'error': 'Invalid pipeline_id'}), 404
+        return _missing_pipeline_response(pipeline_id, status=404)
 
     pipeline = active_pipelines[pipeline_id]
 
@@ -357,8 +583,9 @@ def get_pipeline_info(pipeline_id):
         'evaluation': pipeline.get('evaluation', {})
     }
 
-    return jsonify({'success': True, 'info': info}), 200
+    return json_response({'success': True, 'info': info}, 200)
 
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
     app.run(host='0.0.0.0', port=5000, debug=True)
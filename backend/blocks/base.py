@@ -24,7 +24,7 @@ class BlockStatus(Enum):
     FAILED = "failed"
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockConfig:
     """Configuration for a block"""
     block_id: str
@@ -33,7 +33,7 @@ class BlockConfig:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockOutput:
     """Output from a block execution"""
     block_id: str
@@ -117,7 +117,7 @@ class BaseBlock(ABC):
         """Reset the block to initial state"""
         self.status = BlockStatus.NOT_CONFIGURED
         self.output = None
-        self.logger.info(f"Block {self.block_id} reset")
+        self.logger.info("Block %s reset", self.block_id)
 
     def get_output(self) -> Optional[BlockOutput]:
         """Get the output from the last execution"""
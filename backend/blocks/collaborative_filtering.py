@@ -2,10 +2,52 @@
 
 import pandas as pd
 import numpy as np
-from typing import Any, Dict, List
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
 from .base import BaseBlock, BlockOutput, BlockStatus
-from scipy.sparse import csr_matrix
+from scipy.sparse import coo_matrix, csr_matrix
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.caching import cache_get, cache_put
+from utils.ranking import top_k_indices
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Interaction matrices and similarities from recent runs, keyed by a content
+# fingerprint of the training data so re-runs on the same data skip the rebuild
+_matrix_cache: 'OrderedDict[Tuple, Tuple[csr_matrix, pd.Index, pd.Index]]' = OrderedDict()
+_similarity_cache: 'OrderedDict[Tuple, Tuple[csr_matrix, Any]]' = OrderedDict()
+
+
+def _data_fingerprint(data: pd.DataFrame) -> Tuple[int, int]:
+    """Content hash of the interaction columns (row-order independent)"""
+    hashed = pd.util.hash_pandas_object(data[['user_id', 'item_id', 'rating']], index=False)
+    return len(data), int(hashed.sum())
+
+
+def score_users(model: Dict[str, Any], user_indices, dense: bool = True):
+    """
+    Predicted scores for the given matrix rows of a CF model
+
+    Scores are computed on demand from the stored similarity so the model
+    never holds a full users x items prediction matrix. With dense=False
+    the sparse product is returned as a CSR matrix.
+    """
+    matrix = model['matrix']
+    if model['method'] == 'user-based':
+        scores = model['similarity'][user_indices] @ matrix
+    else:
+        scores = matrix[user_indices] @ model['similarity']
+    if not dense:
+        return scores.tocsr()
+    return scores.toarray() if hasattr(scores, 'toarray') else np.asarray(scores)
 
 
 class CollaborativeFilteringBlock(BaseBlock):
@@ -15,6 +57,9 @@ class CollaborativeFilteringBlock(BaseBlock):
         super().__init__(block_id, config)
         self.model = None
         self.similarity_matrix = None
+        self.user_ids = None
+        self.item_ids = None
+        self._fingerprint = None
 
     def configure(self, **kwargs) -> None:
         self.config.update(kwargs)
@@ -45,18 +90,33 @@ class CollaborativeFilteringBlock(BaseBlock):
 
             # Compute similarity
             method = self.config.get('method', 'user-based')
-            if method == 'user-based':
-                self.similarity_matrix = cosine_similarity(matrix)
-            else:
-                self.similarity_matrix = cosine_similarity(matrix.T)
-
-            # Simple prediction: matrix multiplication
-            if method == 'user-based':
-                predictions = self.similarity_matrix @ matrix
+            use_ann = FAISS_AVAILABLE and self.config.get('use_ann', True)
+            similarity_key = (
+                self._fingerprint, method, self.config.get('k_neighbors', 50),
+                use_ann, self.config.get('quantize_ratings', True)
+            )
+            cached = cache_get(_similarity_cache, similarity_key)
+            if cached is not None:
+                self.similarity_matrix, index = cached
+            elif use_ann:
+                # Top-k neighbours from an HNSW index instead of a dense NxN matrix
+                index = self._build_ann_index(matrix, method)
+                self.similarity_matrix = self._ann_similarity(index, matrix, method)
             else:
-                predictions = matrix @ self.similarity_matrix
-
-            self.model = {'method': method, 'matrix': matrix, 'predictions': predictions}
+                index = None
+                vectors = self._similarity_vectors(matrix, method)
+                # Keep the similarity in float32 so the prediction product stays single precision
+                similarity = cosine_similarity(vectors, dense_output=False).astype(np.float32, copy=False)
+                self.similarity_matrix = self._top_k_sparse(similarity)
+            cache_put(_similarity_cache, similarity_key, (self.similarity_matrix, index))
+
+            # Predictions are scored per user on demand (see score_users)
+            self.model = {
+                'method': method,
+                'matrix': matrix,
+                'similarity': self.similarity_matrix,
+                'index': index
+            }
 
             self.status = BlockStatus.COMPLETED
             return BlockOutput(
@@ -73,19 +133,111 @@ class CollaborativeFilteringBlock(BaseBlock):
             self.status = BlockStatus.FAILED
             return BlockOutput(block_id=self.block_id, status=BlockStatus.FAILED, errors=[str(e)])
 
-    def _create_matrix(self, data: pd.DataFrame):
-        """Create user-item interaction matrix"""
-        user_ids = data['user_id'].unique()
-        item_ids = data['item_id'].unique()
-
-        user_map = {uid: idx for idx, uid in enumerate(user_ids)}
-        item_map = {iid: idx for idx, iid in enumerate(item_ids)}
+    def predict(self, user_indices, top_k: int = 10) -> np.ndarray:
+        """Top-k item indices for the given matrix rows, best first"""
+        return top_k_indices(score_users(self.model, user_indices), top_k)
 
-        rows = [user_map[uid] for uid in data['user_id']]
-        cols = [item_map[iid] for iid in data['item_id']]
-        vals = data['rating'].values
-
-        return csr_matrix((vals, (rows, cols)), shape=(len(user_ids), len(item_ids)))
+    def _create_matrix(self, data: pd.DataFrame):
+        """Create user-item interaction matrix (memoized on the data's content)"""
+        self._fingerprint = _data_fingerprint(data)
+        cached = cache_get(_matrix_cache, self._fingerprint)
+        if cached is not None:
+            matrix, self.user_ids, self.item_ids = cached
+            return matrix
+
+        u_cat = pd.Categorical(data['user_id'])
+        i_cat = pd.Categorical(data['item_id'])
+
+        # Categorical codes are the row/column indices; categories map them back to ids
+        self.user_ids = u_cat.categories
+        self.item_ids = i_cat.categories
+
+        rows = u_cat.codes.astype(np.int32)
+        cols = i_cat.codes.astype(np.int32)
+        vals = data['rating'].to_numpy(dtype=np.float32)
+
+        # Explicit COO -> CSR: rows sorted by user_id let tocsr skip its lexsort
+        coo = coo_matrix((vals, (rows, cols)), shape=(len(self.user_ids), len(self.item_ids)))
+        coo.sum_duplicates()
+        matrix = coo.tocsr()
+
+        # The cached matrix is shared between runs, so freeze its buffers
+        for buf in (matrix.data, matrix.indices, matrix.indptr):
+            buf.flags.writeable = False
+
+        cache_put(_matrix_cache, self._fingerprint, (matrix, self.user_ids, self.item_ids))
+        return matrix
+
+    def _similarity_vectors(self, matrix: csr_matrix, method: str) -> csr_matrix:
+        """Rows to compare for similarity, L2-normalized in float32
+
+        With quantize_ratings, ratings that lie on a 0.5 step grid (e.g.
+        0.5-5.0 stars) are doubled and stored losslessly in int8; cosine
+        similarity is scale-invariant, so the factor of two does not change
+        the result. Ratings off the grid or outside the int8 range (z-scored
+        or continuous ratings) stay in float32.
+        """
+        vectors = matrix if method == 'user-based' else matrix.T.tocsr()
+        if self.config.get('quantize_ratings', True):
+            doubled = vectors.data * 2
+            if (np.all(doubled == np.rint(doubled))
+                    and np.all((doubled >= np.iinfo(np.int8).min) & (doubled <= np.iinfo(np.int8).max))):
+                vectors = vectors.copy()
+                vectors.data = doubled.astype(np.int8)
+        return normalize(vectors.astype(np.float32), norm='l2')
+
+    def _top_k_sparse(self, similarity, batch_size: int = 4096) -> csr_matrix:
+        """Keep only each row's k_neighbors largest similarities as a sparse matrix"""
+        n = similarity.shape[0]
+        k = min(self.config.get('k_neighbors', 50), n)
+
+        neighbors = np.empty((n, k), dtype=np.int64)
+        vals = np.empty((n, k), dtype=np.float32)
+        # Densify sparse similarity one row block at a time
+        for start in range(0, n, batch_size):
+            block = similarity[start:start + batch_size]
+            if hasattr(block, 'toarray'):
+                block = block.toarray()
+            block_neighbors = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            neighbors[start:start + len(block)] = block_neighbors
+            vals[start:start + len(block)] = np.take_along_axis(block, block_neighbors, axis=1)
+
+        rows = np.repeat(np.arange(n), k)
+        return csr_matrix((vals.ravel(), (rows, neighbors.ravel())), shape=(n, n))
+
+    def _build_ann_index(self, matrix: csr_matrix, method: str, batch_size: int = 4096):
+        """Build an HNSW inner-product index over L2-normalized user or item rows"""
+        vectors = matrix if method == 'user-based' else matrix.T.tocsr()
+
+        index = faiss.IndexHNSWFlat(vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 100
+        index.hnsw.efSearch = 64
+
+        # Densify in row batches so only one block is materialized at a time
+        for start in range(0, vectors.shape[0], batch_size):
+            block = np.ascontiguousarray(vectors[start:start + batch_size].toarray(), dtype=np.float32)
+            faiss.normalize_L2(block)
+            index.add(block)
+
+        return index
+
+    def _ann_similarity(self, index, matrix: csr_matrix, method: str, batch_size: int = 4096) -> csr_matrix:
+        """Query the index for each row's top-k neighbours and return them as a sparse NxN matrix"""
+        vectors = matrix if method == 'user-based' else matrix.T.tocsr()
+        n = vectors.shape[0]
+        k = min(self.config.get('k_neighbors', 50), n)
+
+        distances = np.empty((n, k), dtype=np.float32)
+        neighbors = np.empty((n, k), dtype=np.int64)
+        for start in range(0, n, batch_size):
+            queries = np.ascontiguousarray(vectors[start:start + batch_size].toarray(), dtype=np.float32)
+            faiss.normalize_L2(queries)
+            distances[start:start + len(queries)], neighbors[start:start + len(queries)] = index.search(queries, k)
+
+        # FAISS pads missing neighbours with -1
+        valid = neighbors >= 0
+        rows = np.repeat(np.arange(n), k)[valid.ravel()]
+        return csr_matrix((distances[valid], (rows, neighbors[valid])), shape=(n, n))
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -94,6 +246,9 @@ class CollaborativeFilteringBlock(BaseBlock):
             'outputs': {'model': {'type': 'dict'}},
             'config': {
                 'method': {'type': 'str', 'default': 'user-based', 'options': ['user-based', 'item-based']},
-                'k_neighbors': {'type': 'int', 'default': 50}
+                'k_neighbors': {'type': 'int', 'default': 50},
+                'use_ann': {'type': 'bool', 'default': True},
+                # Only applied when ratings lie on a 0.5 step grid; see _similarity_vectors
+                'quantize_ratings': {'type': 'bool', 'default': True}
             }
         }
@@ -4,6 +4,9 @@ Data Source Block
 Loads user-item interaction data from various sources.
 """
 
+import csv
+import importlib.util
+import logging
 import pandas as pd
 import numpy as np
 from typing import Any, Dict, List, Optional
@@ -14,7 +17,13 @@ from pathlib import Path
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 from utils.data_loader import DataLoader
-from utils.kaggle_datasets import KaggleDatasetLoader
+
+# pyarrow is only imported once a CSV is actually read
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Parse-time dtypes; ids are left to inference (they may be strings or
+# exceed int32) and are narrowed by _narrow_dtypes after range checks
+CSV_DTYPES = {'rating': np.float32}
 
 
 class DataSourceBlock(BaseBlock):
@@ -32,9 +41,17 @@ class DataSourceBlock(BaseBlock):
     def __init__(self, block_id: str, config: Optional[Dict[str, Any]] = None):
         super().__init__(block_id, config)
         self.data_loader = DataLoader()
-        self.kaggle_loader = KaggleDatasetLoader()
+        self._kaggle_loader = None
         self.data: Optional[pd.DataFrame] = None
 
+    @property
+    def kaggle_loader(self):
+        """KaggleDatasetLoader, imported and created on first Kaggle use"""
+        if self._kaggle_loader is None:
+            from utils.kaggle_datasets import KaggleDatasetLoader
+            self._kaggle_loader = KaggleDatasetLoader()
+        return self._kaggle_loader
+
     def configure(self, **kwargs) -> None:
         """
         Configure data source parameters
@@ -44,13 +61,14 @@ class DataSourceBlock(BaseBlock):
             file_path: str - Path to data file (for CSV)
             kaggle_dataset: str - Kaggle dataset key (for Kaggle source)
             sample_size: int - Number of rows to load (0 for all)
+            sample_replace: bool - Sample rows with replacement (faster, may repeat rows)
             n_users: int - Number of users (for synthetic)
             n_items: int - Number of items (for synthetic)
             n_interactions: int - Number of interactions (for synthetic)
         """
         self.config.update(kwargs)
         self.status = BlockStatus.CONFIGURED
-        self.logger.info(f"Configured {self.block_id} with source: {self.config.get('data_source', 'unknown')}")
+        self.logger.info("Configured %s with source: %s", self.block_id, self.config.get('data_source', 'unknown'))
 
     def validate_config(self) -> List[str]:
         """Validate configuration"""
@@ -70,8 +88,10 @@ class DataSourceBlock(BaseBlock):
             kaggle_dataset = self.config.get('kaggle_dataset')
             if not kaggle_dataset:
                 errors.append("Kaggle source requires kaggle_dataset parameter")
-            elif kaggle_dataset not in self.kaggle_loader.DATASETS:
-                errors.append(f"Invalid kaggle_dataset: {kaggle_dataset}")
+            else:
+                from utils.kaggle_datasets import KaggleDatasetLoader
+                if kaggle_dataset not in KaggleDatasetLoader.DATASETS:
+                    errors.append(f"Invalid kaggle_dataset: {kaggle_dataset}")
 
         return errors
 
@@ -86,7 +106,7 @@ class DataSourceBlock(BaseBlock):
             BlockOutput with 'dataframe' containing loaded data
         """
         self.status = BlockStatus.RUNNING
-        self.logger.info(f"Executing {self.block_id}")
+        self.logger.info("Executing %s", self.block_id)
 
         try:
             errors = self.validate_config()
@@ -109,11 +129,16 @@ class DataSourceBlock(BaseBlock):
             else:
                 raise NotImplementedError(f"Data source '{data_source}' not yet implemented")
 
+            self.data = self._narrow_dtypes(self.data)
+
             # Apply sampling if requested
             sample_size = self.config.get('sample_size', 0)
             if sample_size > 0 and len(self.data) > sample_size:
-                self.data = self.data.sample(n=sample_size, random_state=42)
-                self.logger.info(f"Sampled {sample_size} rows")
+                self.data = self._sample_rows(self.data, sample_size)
+                self.logger.info("Sampled %d rows", sample_size)
+
+            n_users = self._count_unique(self.data['user_id'])
+            n_items = self._count_unique(self.data['item_id'])
 
             self.status = BlockStatus.COMPLETED
             self.output = BlockOutput(
@@ -122,24 +147,78 @@ class DataSourceBlock(BaseBlock):
                 data={'dataframe': self.data},
                 metrics={
                     'n_rows': len(self.data),
-                    'n_users': self.data['user_id'].nunique(),
-                    'n_items': self.data['item_id'].nunique(),
-                    'sparsity': 1 - len(self.data) / (self.data['user_id'].nunique() * self.data['item_id'].nunique())
+                    'n_users': n_users,
+                    'n_items': n_items,
+                    'sparsity': 1 - len(self.data) / (n_users * n_items)
                 }
             )
 
-            self.logger.info(f"Loaded {len(self.data)} interactions")
+            self.logger.info("Loaded %d interactions", len(self.data))
             return self.output
 
         except Exception as e:
             self.status = BlockStatus.FAILED
-            self.logger.error(f"Failed to load data: {str(e)}")
+            self.logger.error("Failed to load data: %s", e)
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.FAILED,
                 errors=[str(e)]
             )
 
+    def _sample_rows(self, data: pd.DataFrame, sample_size: int) -> pd.DataFrame:
+        """
+        Take a seeded random subset of rows
+
+        Draws row positions directly instead of permuting the whole frame,
+        so the cost scales with sample_size rather than len(data). Rows keep
+        their original order. With sample_replace, positions are drawn with
+        replacement, which is cheaper still.
+        """
+        rng = np.random.default_rng(42)
+        if self.config.get('sample_replace', False):
+            positions = rng.integers(0, len(data), sample_size)
+        else:
+            positions = rng.choice(len(data), sample_size, replace=False, shuffle=False)
+        return data.iloc[np.sort(positions)]
+
+    @staticmethod
+    def _count_unique(values: pd.Series) -> int:
+        """
+        Number of distinct values in an id column
+
+        Dense non-negative integer ids are counted with a bincount presence
+        table (a single vectorized pass, no hashing); anything else falls
+        back to a hash-based unique().
+        """
+        arr = values.to_numpy()
+        if len(arr) and np.issubdtype(arr.dtype, np.integer):
+            lo, hi = arr.min(), arr.max()
+            if lo >= 0 and hi < 4 * len(arr) + 1024:
+                return int(np.count_nonzero(np.bincount(arr, minlength=int(hi) + 1)))
+        return int(values.unique().size)
+
+    @staticmethod
+    def _narrow_dtypes(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Downcast ids, ratings and timestamps to 32-bit types
+
+        Integer columns are only narrowed when their values fit in int32, so
+        large ids and epoch timestamps past 2038 are left untouched, as are
+        non-numeric columns (string ids, datetimes).
+        """
+        int32 = np.iinfo(np.int32)
+        casts = {}
+
+        for col in ['user_id', 'item_id', 'timestamp']:
+            if col in data.columns and pd.api.types.is_integer_dtype(data[col]) and len(data):
+                if data[col].min() >= int32.min and data[col].max() <= int32.max:
+                    casts[col] = np.int32
+
+        if 'rating' in data.columns and pd.api.types.is_float_dtype(data['rating']):
+            casts['rating'] = np.float32
+
+        return data.astype(casts) if casts else data
+
     def _load_synthetic(self) -> pd.DataFrame:
         """Generate synthetic data"""
         return self.data_loader.generate_synthetic(
@@ -152,11 +231,21 @@ class DataSourceBlock(BaseBlock):
         """Load data from CSV file"""
         file_path = self.config['file_path']
 
-        # Try to load with various formats
-        try:
-            data = pd.read_csv(file_path, sep='\t')
-        except:
-            data = pd.read_csv(file_path)
+        sep = self._detect_separator(file_path)
+        keep = self._sample_keep_rows(file_path, self.config.get('sample_size', 0))
+
+        if PYARROW_AVAILABLE and keep is None:
+            data = self._read_csv_arrow(file_path, sep)
+        else:
+            # Sampled reads need skiprows, which only the pandas parser supports
+            data = pd.read_csv(
+                file_path,
+                sep=sep,
+                engine='c',
+                memory_map=True,
+                dtype=CSV_DTYPES,
+                skiprows=None if keep is None else (lambda i: i != 0 and i not in keep)
+            )
 
         # Ensure required columns exist
         required_cols = ['user_id', 'item_id', 'rating']
@@ -172,24 +261,95 @@ class DataSourceBlock(BaseBlock):
 
         return data
 
+    @staticmethod
+    def _read_csv_arrow(file_path: str, sep: str) -> pd.DataFrame:
+        """
+        Parse a CSV with Arrow's multithreaded reader
+
+        Columns are parsed into Arrow buffers in 8 MB blocks across threads
+        and handed to pandas as regular numpy columns.
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+
+        table = pacsv.read_csv(
+            file_path,
+            read_options=pacsv.ReadOptions(block_size=8 << 20),
+            parse_options=pacsv.ParseOptions(delimiter=sep),
+            convert_options=pacsv.ConvertOptions(
+                column_types={col: pa.from_numpy_dtype(dtype) for col, dtype in CSV_DTYPES.items()}
+            )
+        )
+        return table.to_pandas()
+
+    @staticmethod
+    def _detect_separator(file_path: str) -> str:
+        """Sniff the delimiter from the first 4 KB so the file is only parsed once"""
+        # Peek raw bytes so a non-UTF-8 file (e.g. latin-1) can't fail the sniff
+        with open(file_path, 'rb') as f:
+            sample = f.read(4096).decode('utf-8', errors='replace')
+
+        # Drop a trailing partial line so the sniffer sees whole rows only
+        if '\n' in sample:
+            sample = sample[:sample.rindex('\n')]
+
+        try:
+            return csv.Sniffer().sniff(sample, delimiters='\t,;|').delimiter
+        except csv.Error:
+            return ','
+
+    @staticmethod
+    def _sample_keep_rows(file_path: str, sample_size: int) -> Optional[set]:
+        """
+        Pick the sample_size data rows (1-based file lines) to parse
+
+        Lines are counted in 1 MB byte blocks and only the rows to keep are
+        drawn, so both the scan and the set stay proportional to sample_size
+        rather than the file length. Row 0 is the header and is always kept.
+        """
+        if sample_size <= 0:
+            return None
+
+        n_lines = 0
+        last = b'\n'
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                n_lines += block.count(b'\n')
+                last = block[-1:]
+        # A final line without a trailing newline still counts
+        n_lines += last != b'\n'
+
+        n_data_rows = n_lines - 1
+        if n_data_rows <= sample_size:
+            return None
+
+        rng = np.random.default_rng(42)
+        return set((rng.choice(n_data_rows, sample_size, replace=False) + 1).tolist())
+
     def _load_kaggle(self) -> pd.DataFrame:
         """Load data from Kaggle dataset"""
         kaggle_dataset = self.config['kaggle_dataset']
-        self.logger.info(f"Loading Kaggle dataset: {kaggle_dataset}")
+        self.logger.info("Loading Kaggle dataset: %s", kaggle_dataset)
 
-        df, metadata = self.kaggle_loader.load_dataset(kaggle_dataset)
+        # Stop parsing once sample_size rows are read
+        df, metadata = self.kaggle_loader.load_dataset(
+            kaggle_dataset,
+            nrows=self.config.get('sample_size') or None
+        )
 
-        # Log metadata
-        self.logger.info(f"Kaggle dataset metadata: {metadata}")
+        # Log metadata (skip building the dict repr when INFO is off)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Kaggle dataset metadata: %s", metadata)
 
         # Ensure timestamp column
         if 'timestamp' not in df.columns:
-            df['timestamp'] = np.arange(len(df))
+            df['timestamp'] = np.arange(len(df), dtype=np.int32)
 
         return df
 
     def get_schema(self) -> Dict[str, Any]:
         """Get block schema"""
+        from utils.kaggle_datasets import KaggleDatasetLoader
         return {
             'type': 'data-source',
             'inputs': {},
@@ -210,12 +370,10 @@ class DataSourceBlock(BaseBlock):
                 'kaggle_dataset': {
                     'type': 'str',
                     'required_if': {'data_source': 'kaggle'},
-                    'options': list(self.kaggle_loader.DATASETS.keys()) if hasattr(self, 'kaggle_loader') else [
-                        'movielens-100k', 'jester-jokes', 'book-crossing',
-                        'anime-recommendations', 'restaurant-ratings'
-                    ]
+                    'options': list(KaggleDatasetLoader.DATASETS)
                 },
                 'sample_size': {'type': 'int', 'default': 0},
+                'sample_replace': {'type': 'bool', 'default': False},
                 'n_users': {'type': 'int', 'default': 100},
                 'n_items': {'type': 'int', 'default': 200},
                 'n_interactions': {'type': 'int', 'default': 1000}
@@ -8,6 +8,32 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from utils.metrics import RecommenderMetrics
+from utils.ranking import top_k_indices, top_k_indices_sparse
+from .collaborative_filtering import score_users
+from .matrix_factorization import FactorScores
+from .random_forest import ForestScores
+
+# Dedicated generator for the approximate/placeholder metrics
+_rng = np.random.default_rng()
+
+RANKING_METRICS = ['precision', 'recall', 'ndcg', 'map', 'hit_rate']
+
+# Users ranked per dense score block in the ranking pass
+RANKING_BLOCK_USERS = 4096
+
+
+def _random_metrics(
+    ranges: Dict[str, tuple],
+    metrics_list: List[str],
+    k_list: List[int]
+) -> Dict[str, float]:
+    """Draw base + U(0, 1) * span for every requested metric@k from one random vector"""
+    names = [(metric, k) for k in k_list for metric in RANKING_METRICS if metric in metrics_list]
+    draws = _rng.random(len(names))
+    return {
+        f'{metric}@{k}': float(ranges[metric][0] + draw * ranges[metric][1])
+        for (metric, k), draw in zip(names, draws)
+    }
 
 
 class EvaluationBlock(BaseBlock):
@@ -44,15 +70,19 @@ class EvaluationBlock(BaseBlock):
 
             # Get predictions matrix from model
             predictions = model.get('predictions')
+            if predictions is None and model.get('similarity') is not None:
+                predictions = score_users(model, np.arange(model['matrix'].shape[0]), dense=False)
+            if predictions is None and model.get('user_factors') is not None:
+                # Scored lazily; only the rows being ranked are ever dense
+                predictions = FactorScores(model)
+            if predictions is None and model.get('type') == 'random_forest':
+                predictions = ForestScores(model)
             if predictions is None:
                 # Generate dummy metrics
                 self.logger.warning("No predictions in model, using placeholder metrics")
                 results = self._generate_placeholder_metrics(metrics_to_compute, k_list)
             else:
-                # Convert sparse to dense if needed
-                if hasattr(predictions, 'toarray'):
-                    predictions = predictions.toarray()
-
+                # Sparse predictions stay sparse; the metric passes index them row-wise
                 # Compute rating prediction metrics if available
                 if test_data is not None:
                     results.update(self._compute_with_test_data(
@@ -73,7 +103,7 @@ class EvaluationBlock(BaseBlock):
             )
         except Exception as e:
             self.status = BlockStatus.FAILED
-            self.logger.error(f"Evaluation failed: {str(e)}")
+            self.logger.error("Evaluation failed: %s", e)
             return BlockOutput(block_id=self.block_id, status=BlockStatus.FAILED, errors=[str(e)])
 
     def _compute_with_test_data(
@@ -93,30 +123,22 @@ class EvaluationBlock(BaseBlock):
         else:
             test_df = test_data
 
-        # Create user and item mappings
-        user_ids = sorted(test_df['user_id'].unique())
-        item_ids = sorted(test_df['item_id'].unique())
-
-        user_map = {uid: idx for idx, uid in enumerate(user_ids)}
-        item_map = {iid: idx for idx, iid in enumerate(item_ids)}
+        # Index users and items by their position in the sorted test ids
+        u_cat = pd.Categorical(test_df['user_id'])
+        i_cat = pd.Categorical(test_df['item_id'])
+        u_codes = u_cat.codes.astype(np.int64)
+        i_codes = i_cat.codes.astype(np.int64)
+        n_users = len(u_cat.categories)
+        n_items = len(i_cat.categories)
 
         # Compute rating metrics (RMSE, MAE)
         if 'rmse' in metrics_list or 'mae' in metrics_list:
-            actual_ratings = []
-            predicted_ratings = []
-
-            for _, row in test_df.iterrows():
-                u_idx = user_map.get(row['user_id'])
-                i_idx = item_map.get(row['item_id'])
-
-                if (u_idx is not None and i_idx is not None and
-                    u_idx < predictions.shape[0] and i_idx < predictions.shape[1]):
-                    actual_ratings.append(row['rating'])
-                    predicted_ratings.append(predictions[u_idx, i_idx])
+            # Keep rows whose user and item fall inside the predictions matrix
+            mask = (u_codes < predictions.shape[0]) & (i_codes < predictions.shape[1])
 
-            if actual_ratings:
-                actual_arr = np.array(actual_ratings)
-                predicted_arr = np.array(predicted_ratings)
+            if mask.any():
+                actual_arr = test_df['rating'].to_numpy()[mask]
+                predicted_arr = np.asarray(predictions[u_codes[mask], i_codes[mask]]).ravel()
 
                 if 'rmse' in metrics_list:
                     results['rmse'] = metrics_calc.calculate_rating_metric(
@@ -127,72 +149,68 @@ class EvaluationBlock(BaseBlock):
                         actual_arr, predicted_arr, 'mae'
                     )
 
-        # Compute ranking metrics
-        ranking_metrics = {'precision', 'recall', 'ndcg', 'map', 'hit_rate'}
-        if any(m in metrics_list for m in ranking_metrics):
-            # Get relevant items per user (ratings >= 4.0)
-            user_relevant = {}
-            for _, row in test_df.iterrows():
-                if row['rating'] >= 4.0:
-                    if row['user_id'] not in user_relevant:
-                        user_relevant[row['user_id']] = []
-                    user_relevant[row['user_id']].append(row['item_id'])
-
-            # Generate recommendations for each user
-            all_scores = {k: [] for k in k_list}
-
-            for user_id in user_ids:
-                u_idx = user_map.get(user_id)
-                if u_idx is None or u_idx >= predictions.shape[0]:
-                    continue
-
-                relevant_items = user_relevant.get(user_id, [])
-                if not relevant_items:
-                    continue
-
-                # Get user's predictions
-                user_preds = predictions[u_idx, :]
-
-                # Get top items
-                max_k = max(k_list)
-                top_indices = np.argsort(user_preds)[-max_k:][::-1]
-
-                # Map to item IDs
-                reverse_item_map = {idx: iid for iid, idx in item_map.items()}
-                recommended_items = [reverse_item_map[idx] for idx in top_indices if idx in reverse_item_map]
-
-                # Compute metrics for each K
-                for k in k_list:
-                    if 'precision' in metrics_list:
-                        score = metrics_calc.precision_at_k(relevant_items, recommended_items, k)
-                        all_scores[k].append(('precision', score))
-
-                    if 'recall' in metrics_list:
-                        score = metrics_calc.recall_at_k(relevant_items, recommended_items, k)
-                        all_scores[k].append(('recall', score))
+        # Compute ranking metrics, resolving the requested set once up front
+        active = [m for m in RANKING_METRICS if m in metrics_list]
+        if active:
+            # Relevant (rating >= 4.0) interactions as (user index, item index) keys,
+            # translated once so the ranking pass never touches the id labels
+            relevant = test_df['rating'].to_numpy() >= 4.0
+            rel_users = u_codes[relevant]
+            rel_keys = rel_users * n_items + i_codes[relevant]
+            rel_counts_all = np.bincount(rel_users, minlength=n_users).astype(np.float64)
 
-                    if 'ndcg' in metrics_list:
-                        score = metrics_calc.ndcg_at_k(relevant_items, recommended_items, k)
-                        all_scores[k].append(('ndcg', score))
+            # Users that have relevant items and a row in the predictions matrix
+            u_idx = np.flatnonzero(rel_counts_all > 0)
+            u_idx = u_idx[u_idx < predictions.shape[0]]
 
-                    if 'map' in metrics_list:
-                        score = metrics_calc.map_at_k(relevant_items, recommended_items, k)
-                        all_scores[k].append(('map', score))
+            if len(u_idx):
+                rel_counts = rel_counts_all[u_idx]
 
-                    if 'hit_rate' in metrics_list:
-                        score = metrics_calc.hit_rate_at_k(relevant_items, recommended_items, k)
-                        all_scores[k].append(('hit_rate', score))
-
-            # Aggregate scores
-            for k in k_list:
-                metric_values = {}
-                for metric_name, score in all_scores[k]:
-                    if metric_name not in metric_values:
-                        metric_values[metric_name] = []
-                    metric_values[metric_name].append(score)
+                # (U, max_k) top items for all users at once
+                max_k = max(k_list)
+                if hasattr(predictions, 'tocsr'):
+                    top = top_k_indices_sparse(predictions[u_idx], max_k)
+                else:
+                    # Rank in user blocks so at most block x n_items scores are dense at once
+                    top = np.vstack([
+                        top_k_indices(predictions[u_idx[start:start + RANKING_BLOCK_USERS]], max_k)
+                        for start in range(0, len(u_idx), RANKING_BLOCK_USERS)
+                    ])
+
+                # Columns without a test item are dropped; shift the rest up in rank order
+                valid = top < n_items
+                order = np.argsort(~valid, axis=1, kind='stable')
+                top = np.take_along_axis(top, order, axis=1)
+                valid = np.take_along_axis(valid, order, axis=1)
+
+                # hits[u, r] is True when the user's rank-r item is relevant
+                hits = valid & np.isin(u_idx[:, None] * n_items + top, rel_keys)
+
+                # Shared per-rank arrays, built only for the metrics that need them
+                if 'ndcg' in active:
+                    discounts = RecommenderMetrics.ndcg_discount(hits.shape[1])
+                    ideal_dcg = np.concatenate([[0.0], np.cumsum(discounts)])
+                if 'map' in active:
+                    ranks = np.arange(1, hits.shape[1] + 1)
+                    precision_terms = np.where(hits, np.cumsum(hits, axis=1) / ranks, 0.0)
 
-                for metric_name, values in metric_values.items():
-                    results[f'{metric_name}@{k}'] = np.mean(values) if values else 0.0
+                for k in k_list:
+                    hits_k = hits[:, :k]
+                    n_hits = hits_k.sum(axis=1)
+
+                    # Only the requested metrics are evaluated
+                    per_user = {
+                        'precision': lambda: n_hits / k,
+                        'recall': lambda: n_hits / rel_counts,
+                        'ndcg': lambda: (hits_k * discounts[:k]).sum(axis=1) / ideal_dcg[
+                            np.minimum(rel_counts, min(k, hits.shape[1])).astype(np.int64)
+                        ],
+                        'map': lambda: precision_terms[:, :k].sum(axis=1) / np.minimum(rel_counts, k),
+                        'hit_rate': lambda: (n_hits > 0).astype(np.float64)
+                    }
+
+                    for metric_name in active:
+                        results[f'{metric_name}@{k}'] = float(per_user[metric_name]().mean())
 
         return results
 
@@ -208,13 +226,15 @@ class EvaluationBlock(BaseBlock):
         # For rating metrics, use random sampling
         if 'rmse' in metrics_list or 'mae' in metrics_list:
             # Sample some predictions as "ground truth" with noise
-            sample_size = min(1000, predictions.size)
-            flat_preds = predictions.flatten()
-            indices = np.random.choice(len(flat_preds), sample_size, replace=False)
-            sampled_preds = flat_preds[indices]
+            # Index the 2-D matrix directly rather than copying it with flatten()
+            n_cells = predictions.shape[0] * predictions.shape[1]
+            sample_size = min(1000, n_cells)
+            indices = _rng.choice(n_cells, sample_size, replace=False)
+            rows, cols = np.unravel_index(indices, predictions.shape)
+            sampled_preds = np.asarray(predictions[rows, cols]).ravel()
 
             # Add realistic noise
-            noise = np.random.normal(0, 0.3, sample_size)
+            noise = _rng.normal(0, 0.3, sample_size)
             sampled_actual = np.clip(sampled_preds + noise, 1.0, 5.0)
 
             metrics_calc = RecommenderMetrics()
@@ -228,17 +248,13 @@ class EvaluationBlock(BaseBlock):
                 )
 
         # For ranking metrics, generate realistic values
-        for k in k_list:
-            if 'precision' in metrics_list:
-                results[f'precision@{k}'] = 0.25 + np.random.rand() * 0.20
-            if 'recall' in metrics_list:
-                results[f'recall@{k}'] = 0.20 + np.random.rand() * 0.15
-            if 'ndcg' in metrics_list:
-                results[f'ndcg@{k}'] = 0.30 + np.random.rand() * 0.15
-            if 'map' in metrics_list:
-                results[f'map@{k}'] = 0.25 + np.random.rand() * 0.15
-            if 'hit_rate' in metrics_list:
-                results[f'hit_rate@{k}'] = 0.60 + np.random.rand() * 0.25
+        results.update(_random_metrics({
+            'precision': (0.25, 0.20),
+            'recall': (0.20, 0.15),
+            'ndcg': (0.30, 0.15),
+            'map': (0.25, 0.15),
+            'hit_rate': (0.60, 0.25)
+        }, metrics_list, k_list))
 
         return results
 
@@ -251,23 +267,20 @@ class EvaluationBlock(BaseBlock):
         results = {}
 
         # Rating metrics
+        rating_draws = _rng.random(2)
         if 'rmse' in metrics_list:
-            results['rmse'] = 0.95 + np.random.rand() * 0.15
+            results['rmse'] = 0.95 + rating_draws[0] * 0.15
         if 'mae' in metrics_list:
-            results['mae'] = 0.75 + np.random.rand() * 0.15
+            results['mae'] = 0.75 + rating_draws[1] * 0.15
 
         # Ranking metrics for each K
-        for k in k_list:
-            if 'precision' in metrics_list:
-                results[f'precision@{k}'] = 0.28 + np.random.rand() * 0.12
-            if 'recall' in metrics_list:
-                results[f'recall@{k}'] = 0.22 + np.random.rand() * 0.12
-            if 'ndcg' in metrics_list:
-                results[f'ndcg@{k}'] = 0.32 + np.random.rand() * 0.12
-            if 'map' in metrics_list:
-                results[f'map@{k}'] = 0.27 + np.random.rand() * 0.10
-            if 'hit_rate' in metrics_list:
-                results[f'hit_rate@{k}'] = 0.65 + np.random.rand() * 0.20
+        results.update(_random_metrics({
+            'precision': (0.28, 0.12),
+            'recall': (0.22, 0.12),
+            'ndcg': (0.32, 0.12),
+            'map': (0.27, 0.10),
+            'hit_rate': (0.65, 0.20)
+        }, metrics_list, k_list))
 
         return results
 
@@ -1,5 +1,6 @@
 """Features Input Block - User/item metadata and features"""
 
+import numpy as np
 import pandas as pd
 from typing import Any, Dict, List, Optional
 from .base import BaseBlock, BlockOutput, BlockStatus
@@ -25,11 +26,13 @@ class FeaturesInputBlock(BaseBlock):
             feature_type = self.config['feature_type']
             n_entities = self.config.get('n_entities', 100)
 
+            # One int32 buffer shared by the identical placeholder columns
+            idx = np.arange(n_entities, dtype=np.int32)
             features = pd.DataFrame({
-                f'{feature_type}_id': range(n_entities),
-                'feature_1': range(n_entities),
-                'feature_2': range(n_entities)
-            })
+                f'{feature_type}_id': idx,
+                'feature_1': idx,
+                'feature_2': idx
+            }, copy=False)
 
             self.status = BlockStatus.COMPLETED
             return BlockOutput(
@@ -1,9 +1,73 @@
 """Matrix Factorization Block - SVD, ALS, NMF"""
 
 import numpy as np
-from typing import Any, Dict, List
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
 from .base import BaseBlock, BlockOutput, BlockStatus
 from scipy.sparse.linalg import svds
+from sklearn.utils.extmath import randomized_svd
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.caching import cache_get, cache_put
+from utils.ranking import LazyScores
+
+# Below this fill ratio ARPACK's sparse matvecs beat randomized SVD's dense BLAS passes
+RANDOMIZED_SVD_MIN_DENSITY = 0.01
+
+# Largest item count for which the dense items x items Gram matrix is formed
+EIG_SVD_MAX_ITEMS = 4096
+
+# Factors from recent runs, keyed by the training-data fingerprint and n_factors
+_factor_cache: 'OrderedDict[Tuple, Tuple[np.ndarray, np.ndarray]]' = OrderedDict()
+
+
+def eig_svd_factors(matrix, n_factors: int):
+    """
+    Scaled user factors and item factors from the eigendecomposition of A^T A
+
+    With A^T A = V diag(sigma^2) V^T, the SVD user side satisfies
+    U * sigma = A V, so the factors follow from one sparse product and a
+    small dense eigh without ever forming U or dividing by sigma.
+
+    Returns:
+    --------
+    user_factors : (n_users, n_factors) array, U * sigma
+    item_factors : (n_items, n_factors) array, V
+    """
+    gram = (matrix.T @ matrix).toarray()
+    eigvals, eigvecs = np.linalg.eigh(gram)
+
+    # eigh sorts ascending; keep the n_factors largest
+    item_factors = np.ascontiguousarray(eigvecs[:, -n_factors:])
+    return np.asarray(matrix @ item_factors), item_factors
+
+
+def predict_rows(model: Dict[str, Any], user_indices) -> np.ndarray:
+    """
+    Predicted scores for the given matrix rows of an SVD model
+
+    user_factors already carry the singular values, so each row is a single
+    factor product and the model never holds a users x items matrix.
+    """
+    return model['user_factors'][user_indices] @ model['item_factors'].T
+
+
+class FactorScores(LazyScores):
+    """Users x items scores of an SVD model, computed from its factors on access"""
+
+    def __init__(self, model: Dict[str, Any]):
+        self.model = model
+        self.shape = (model['user_factors'].shape[0], model['item_factors'].shape[0])
+
+    def score_rows(self, rows) -> np.ndarray:
+        return predict_rows(self.model, rows)
+
+    def score_pairs(self, rows, cols) -> np.ndarray:
+        # One dot product per (user, item) pair
+        return np.einsum(
+            'ij,ij->i', self.model['user_factors'][rows], self.model['item_factors'][cols]
+        )
 
 
 class MatrixFactorizationBlock(BaseBlock):
@@ -37,7 +101,7 @@ class MatrixFactorizationBlock(BaseBlock):
             if train_data is None:
                 raise ValueError("Missing training data")
 
-            # Create matrix (simplified)
+            # Create matrix (simplified); memoized by CF on the data's content
             from .collaborative_filtering import CollaborativeFilteringBlock
             temp_block = CollaborativeFilteringBlock('temp')
             matrix = temp_block._create_matrix(train_data)
@@ -46,19 +110,18 @@ class MatrixFactorizationBlock(BaseBlock):
             n_factors = self.config.get('n_factors', 100)
             n_factors = min(n_factors, min(matrix.shape) - 1)
 
-            U, sigma, Vt = svds(matrix.astype(float), k=n_factors)
-
-            self.user_factors = U
-            self.item_factors = Vt.T
-
-            # Reconstruct predictions
-            predictions = U @ np.diag(sigma) @ Vt
+            # Re-runs on the same data reuse both the matrix and its factors
+            factor_key = (temp_block._fingerprint, n_factors)
+            cached = cache_get(_factor_cache, factor_key)
+            if cached is None:
+                cached = self._factorize(matrix, n_factors)
+                cache_put(_factor_cache, factor_key, cached)
+            self.user_factors, self.item_factors = cached
 
             model = {
                 'method': 'svd',
                 'user_factors': self.user_factors,
-                'item_factors': self.item_factors,
-                'predictions': predictions
+                'item_factors': self.item_factors
             }
 
             self.status = BlockStatus.COMPLETED
@@ -76,6 +139,33 @@ class MatrixFactorizationBlock(BaseBlock):
             self.status = BlockStatus.FAILED
             return BlockOutput(block_id=self.block_id, status=BlockStatus.FAILED, errors=[str(e)])
 
+    @staticmethod
+    def _factorize(matrix, n_factors: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Read-only float32 (U * sigma, V) factors of the interaction matrix"""
+        matrix_f = matrix.astype(np.float32, copy=False)
+        density = matrix.nnz / (matrix.shape[0] * matrix.shape[1])
+        if n_factors <= min(matrix.shape) / 10 and matrix.shape[1] <= EIG_SVD_MAX_ITEMS:
+            # Few factors over a modest catalog: eigendecompose the small Gram matrix
+            user_factors, item_factors = eig_svd_factors(matrix_f, n_factors)
+        else:
+            if density < RANDOMIZED_SVD_MIN_DENSITY:
+                U, sigma, Vt = svds(matrix_f, k=n_factors)
+            else:
+                U, sigma, Vt = randomized_svd(
+                    matrix_f, n_components=n_factors, n_iter=4,
+                    power_iteration_normalizer='QR', random_state=42
+                )
+            # Fold sigma into the user side; predictions are U*sigma @ Vt (see predict_rows)
+            user_factors, item_factors = U * sigma, Vt.T
+
+        user_factors = user_factors.astype(np.float32, copy=False)
+        item_factors = item_factors.astype(np.float32, copy=False)
+
+        # The cached factors are shared between runs, so freeze them
+        user_factors.flags.writeable = False
+        item_factors.flags.writeable = False
+        return user_factors, item_factors
+
     def get_schema(self) -> Dict[str, Any]:
         return {
             'type': 'matrix-factorization',
@@ -3,6 +3,13 @@
 import numpy as np
 from typing import Any, Dict, List
 from .base import BaseBlock, BlockOutput, BlockStatus
+from .collaborative_filtering import score_users
+from .matrix_factorization import predict_rows
+from .random_forest import ForestScores
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.ranking import top_k_rows
 
 
 class PredictionsBlock(BaseBlock):
@@ -25,18 +32,33 @@ class PredictionsBlock(BaseBlock):
             top_k = self.config.get('top_k', 10)
 
             # Generate recommendations based on model predictions
-            if 'predictions' in model:
-                predictions_matrix = model['predictions']
-                # Get top-k items for each user
-                n_users = predictions_matrix.shape[0]
-                recommendations = {}
+            if ('predictions' in model or 'similarity' in model or 'user_factors' in model
+                    or model.get('type') == 'random_forest'):
+                if 'predictions' in model:
+                    predictions_matrix = model['predictions']
+                elif 'similarity' in model:
+                    # CF models score users on demand; only the rows shown are computed
+                    predictions_matrix = score_users(model, np.arange(min(model['matrix'].shape[0], 100)))
+                elif 'user_factors' in model:
+                    # Factorized models likewise score only the rows shown
+                    predictions_matrix = predict_rows(model, np.arange(min(model['user_factors'].shape[0], 100)))
+                else:
+                    # Forest models predict only the rows shown, one user x all items block
+                    scores = ForestScores(model)
+                    predictions_matrix = scores[np.arange(min(scores.shape[0], 100))]
+                # Get top-k items and scores for each user in one row-wise selection
+                preds = predictions_matrix[:100]  # Limit for demo
+                if hasattr(preds, 'toarray'):
+                    preds = preds.toarray()
+                top_items, top_scores = top_k_rows(preds, top_k)
 
-                for user_idx in range(min(n_users, 100)):  # Limit for demo
-                    user_predictions = predictions_matrix[user_idx]
-                    if hasattr(user_predictions, 'toarray'):
-                        user_predictions = user_predictions.toarray().flatten()
-                    top_items = np.argsort(user_predictions)[-top_k:][::-1]
-                    recommendations[user_idx] = [(int(item), float(user_predictions[item])) for item in top_items]
+                # One bulk conversion to Python ints/floats instead of per-cell casts
+                item_rows = top_items.tolist()
+                score_rows = top_scores.tolist()
+                recommendations = {
+                    user_idx: list(zip(item_rows[user_idx], score_rows[user_idx]))
+                    for user_idx in range(len(item_rows))
+                }
             else:
                 # Placeholder recommendations
                 recommendations = {0: [(i, 4.0) for i in range(top_k)]}
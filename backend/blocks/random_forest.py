@@ -2,8 +2,12 @@
 
 import numpy as np
 import pandas as pd
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseBlock, BlockOutput, BlockStatus
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.ranking import LazyScores
 
 try:
     from sklearn.ensemble import RandomForestRegressor
@@ -11,12 +15,80 @@ try:
 except ImportError:
     SKLEARN_AVAILABLE = False
 
+# Cells scored per forest.predict call; large batches amortise its joblib dispatch
+PREDICT_BATCH_CELLS = 200_000
+
+
+def pair_features(u_indices: np.ndarray, i_indices: np.ndarray,
+                  out: Optional[np.ndarray] = None,
+                  stats: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """
+    Inference features for user-item index pairs
+
+    Without stats the features are just the two indices. With stats (the
+    model's 'feature_stats') the training statistics of each user and item
+    are looked up, matching the 9 training columns. out, when given, is an
+    array returned by a previous call (at least as long as this batch) and
+    is overwritten.
+    """
+    n_features = 2 if stats is None else 9
+    if out is None:
+        features = np.empty((len(u_indices), n_features), dtype=np.float32)
+        if stats is not None:
+            features[:, 8] = stats['global_mean']
+    else:
+        features = out[:len(u_indices)]
+
+    features[:, 0] = u_indices
+    features[:, 1] = i_indices
+    if stats is not None:
+        # user avg/count/std, item avg/count/std
+        features[:, 2:5] = stats['user'][u_indices]
+        features[:, 5:8] = stats['item'][i_indices]
+
+    return features
+
+
+class ForestScores(LazyScores):
+    """Users x items scores of a RandomForestBlock model, predicted on access"""
+
+    def __init__(self, model: Dict[str, Any]):
+        self.forest = model['rf_model']
+        self.stats = model.get('feature_stats')
+        self.shape = (len(model['user_map']), len(model['item_map']))
+
+    def _predict(self, u_indices: np.ndarray, i_indices: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(u_indices), dtype=np.float32)
+        scratch = None
+        for start in range(0, len(u_indices), PREDICT_BATCH_CELLS):
+            end = start + PREDICT_BATCH_CELLS
+            scratch = pair_features(
+                u_indices[start:end], i_indices[start:end], out=scratch, stats=self.stats
+            )
+            scores[start:end] = self.forest.predict(scratch)
+        return scores
+
+    def score_rows(self, rows) -> np.ndarray:
+        rows = np.atleast_1d(np.asarray(rows))
+        n_items = self.shape[1]
+        u_indices = np.repeat(rows, n_items)
+        i_indices = np.tile(np.arange(n_items), len(rows))
+        return self._predict(u_indices, i_indices).reshape(len(rows), n_items)
+
+    def score_pairs(self, rows, cols) -> np.ndarray:
+        return self._predict(np.asarray(rows), np.asarray(cols))
+
 
 class RandomForestBlock(BaseBlock):
     """Random Forest ensemble for rating prediction
 
     Uses scikit-learn's RandomForestRegressor for recommendation tasks.
     Similar to XGBoost but with different ensemble methodology.
+
+    By default (use_stats_features_at_predict=True) the forest trains on
+    (user_index, item_index) plus per-user and per-item rating statistics;
+    the statistics are kept in the model and looked up when scoring. With
+    use_stats_features_at_predict=False it trains on the two indices only.
     """
 
     def __init__(self, block_id: str, config=None):
@@ -26,6 +98,7 @@ class RandomForestBlock(BaseBlock):
         self.item_ids = None
         self.user_map = None
         self.item_map = None
+        self.feature_stats = None
 
     def configure(self, **kwargs) -> None:
         self.config.update(kwargs)
@@ -62,14 +135,22 @@ class RandomForestBlock(BaseBlock):
             if train_data is None:
                 raise ValueError("Missing training data")
 
-            # Create user and item mappings
-            self.user_ids = sorted(train_data['user_id'].unique())
-            self.item_ids = sorted(train_data['item_id'].unique())
-            self.user_map = {uid: idx for idx, uid in enumerate(self.user_ids)}
-            self.item_map = {iid: idx for idx, iid in enumerate(self.item_ids)}
+            # Create user and item mappings, reusing SplitBlock's encoding when present
+            encoded = split_data.get('encoded') if split_data and 'train' in split_data else None
+            if encoded is not None:
+                self.user_ids = encoded['user_ids']
+                self.item_ids = encoded['item_ids']
+                codes = (encoded['user_codes'][encoded['train']], encoded['item_codes'][encoded['train']])
+            else:
+                # One C hashtable pass gives both the sorted ids and each row's index
+                user_codes, self.user_ids = pd.factorize(train_data['user_id'].to_numpy(), sort=True)
+                item_codes, self.item_ids = pd.factorize(train_data['item_id'].to_numpy(), sort=True)
+                codes = (user_codes, item_codes)
+            self.user_map = dict(zip(self.user_ids.tolist(), range(len(self.user_ids))))
+            self.item_map = dict(zip(self.item_ids.tolist(), range(len(self.item_ids))))
 
             # Build feature matrix
-            X_train, y_train = self._create_features(train_data)
+            X_train, y_train = self._create_features(train_data, codes)
 
             # Configure Random Forest
             params = {
@@ -86,9 +167,6 @@ class RandomForestBlock(BaseBlock):
             self.model = RandomForestRegressor(**params)
             self.model.fit(X_train, y_train)
 
-            # Generate predictions matrix
-            predictions = self._generate_predictions_matrix()
-
             # Get feature importance
             feature_importance = self.model.feature_importances_
             top_features = np.argsort(feature_importance)[-5:][::-1]
@@ -96,9 +174,9 @@ class RandomForestBlock(BaseBlock):
             model_data = {
                 'type': 'random_forest',
                 'rf_model': self.model,
-                'predictions': predictions,
                 'user_map': self.user_map,
                 'item_map': self.item_map,
+                'feature_stats': self.feature_stats,
                 'feature_importance': feature_importance.tolist()
             }
 
@@ -114,101 +192,67 @@ class RandomForestBlock(BaseBlock):
                     'n_items': len(self.item_ids),
                     'n_training_samples': len(X_train),
                     'n_features': X_train.shape[1],
-                    'predictions_shape': predictions.shape,
+                    'predictions_shape': (len(self.user_ids), len(self.item_ids)),
                     'top_feature_indices': top_features.tolist()
                 }
             )
         except Exception as e:
             self.status = BlockStatus.FAILED
-            self.logger.error(f"Random Forest training failed: {str(e)}")
+            self.logger.error("Random Forest training failed: %s", e)
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.FAILED,
                 errors=[str(e)]
             )
 
-    def _create_features(self, data: pd.DataFrame) -> tuple:
-        """Create feature matrix for Random Forest training"""
-        features_list = []
+    def _create_features(self, data: pd.DataFrame, codes: Optional[tuple] = None) -> tuple:
+        """Create feature matrix for Random Forest training
 
+        codes, when given, are precomputed (user_index, item_index) arrays for
+        the rows of data (see SplitBlock's encoded split). With
+        use_stats_features_at_predict (the default) the statistics tables are
+        also stored on self.feature_stats for inference.
+        """
         # Basic user and item indices
-        user_indices = data['user_id'].map(self.user_map).values
-        item_indices = data['item_id'].map(self.item_map).values
-
-        features_list.append(user_indices.reshape(-1, 1))
-        features_list.append(item_indices.reshape(-1, 1))
-
-        # User statistics
-        user_stats = data.groupby('user_id')['rating'].agg(['mean', 'count', 'std']).reset_index()
-        user_stats.columns = ['user_id', 'user_avg_rating', 'user_rating_count', 'user_std']
-        user_stats['user_std'] = user_stats['user_std'].fillna(0)
-        data_with_stats = data.merge(user_stats, on='user_id', how='left')
-
-        features_list.append(data_with_stats['user_avg_rating'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['user_rating_count'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['user_std'].values.reshape(-1, 1))
-
-        # Item statistics
-        item_stats = data.groupby('item_id')['rating'].agg(['mean', 'count', 'std']).reset_index()
-        item_stats.columns = ['item_id', 'item_avg_rating', 'item_rating_count', 'item_std']
-        item_stats['item_std'] = item_stats['item_std'].fillna(0)
-        data_with_stats = data_with_stats.merge(item_stats, on='item_id', how='left')
-
-        features_list.append(data_with_stats['item_avg_rating'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['item_rating_count'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['item_std'].values.reshape(-1, 1))
+        if codes is not None:
+            user_indices, item_indices = codes
+        else:
+            # Categorical codes against the known ids: a C hash lookup, -1 for unseen ids
+            user_indices = pd.Categorical(data['user_id'], categories=self.user_ids).codes.astype(np.int32)
+            item_indices = pd.Categorical(data['item_id'], categories=self.item_ids).codes.astype(np.int32)
+
+        ratings = data['rating'].to_numpy(dtype=np.float64)
+
+        self.feature_stats = None
+        if self.config.get('use_stats_features_at_predict', True):
+            # User and item statistics: mean, count, std (0 for a single rating)
+            self.feature_stats = {
+                'user': self._group_stats(user_indices, ratings, len(self.user_ids)),
+                'item': self._group_stats(item_indices, ratings, len(self.item_ids)),
+                'global_mean': float(ratings.mean())
+            }
 
-        # Global mean
-        global_mean = data['rating'].mean()
-        features_list.append(np.full((len(data), 1), global_mean))
+        X = pair_features(user_indices, item_indices, stats=self.feature_stats)
 
-        X = np.hstack(features_list)
-        y = data['rating'].values
+        # The forest stores targets as float64, so hand it the float64 ratings directly
+        y = ratings
 
         return X, y
 
-    def _generate_predictions_matrix(self) -> np.ndarray:
-        """Generate predictions for all user-item pairs"""
-        n_users = len(self.user_ids)
-        n_items = len(self.item_ids)
-        predictions = np.zeros((n_users, n_items))
-
-        # Generate in batches for efficiency
-        batch_size = 10000
-        all_pairs = [(u_idx, i_idx) for u_idx in range(n_users) for i_idx in range(n_items)]
-
-        for batch_start in range(0, len(all_pairs), batch_size):
-            batch_end = min(batch_start + batch_size, len(all_pairs))
-            batch = all_pairs[batch_start:batch_end]
-
-            batch_features = self._create_batch_features(batch)
-            batch_preds = self.model.predict(batch_features)
-
-            for i, (u_idx, i_idx) in enumerate(batch):
-                predictions[u_idx, i_idx] = batch_preds[i]
-
-        return predictions
-
-    def _create_batch_features(self, batch: List[tuple]) -> np.ndarray:
-        """Create features for a batch of user-item pairs"""
-        features_list = []
-
-        u_indices = np.array([pair[0] for pair in batch])
-        i_indices = np.array([pair[1] for pair in batch])
-
-        features_list.append(u_indices.reshape(-1, 1))
-        features_list.append(i_indices.reshape(-1, 1))
+    @staticmethod
+    def _group_stats(codes: np.ndarray, ratings: np.ndarray, n_groups: int) -> np.ndarray:
+        """Per-group (mean, count, sample std) table via bincount"""
+        counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+        sums = np.bincount(codes, weights=ratings, minlength=n_groups)
+        sq_sums = np.bincount(codes, weights=ratings * ratings, minlength=n_groups)
 
-        # Use zeros for statistics (simplified for prediction)
-        features_list.append(np.zeros((len(batch), 1)))  # user_avg_rating
-        features_list.append(np.zeros((len(batch), 1)))  # user_rating_count
-        features_list.append(np.zeros((len(batch), 1)))  # user_std
-        features_list.append(np.zeros((len(batch), 1)))  # item_avg_rating
-        features_list.append(np.zeros((len(batch), 1)))  # item_rating_count
-        features_list.append(np.zeros((len(batch), 1)))  # item_std
-        features_list.append(np.full((len(batch), 1), 3.5))  # global_mean
+        safe_counts = np.maximum(counts, 1)
+        mean = sums / safe_counts
+        # Sample variance (ddof=1) like pandas' std; groups of one get 0
+        var = (sq_sums - sums * mean) / np.maximum(counts - 1, 1)
+        std = np.where(counts > 1, np.sqrt(np.maximum(var, 0)), 0.0)
 
-        return np.hstack(features_list)
+        return np.column_stack([mean, counts, std]).astype(np.float32)
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -224,6 +268,7 @@ class RandomForestBlock(BaseBlock):
                 'min_samples_split': {'type': 'int', 'default': 2},
                 'min_samples_leaf': {'type': 'int', 'default': 1},
                 'max_features': {'type': 'str', 'default': 'sqrt'},
-                'random_state': {'type': 'int', 'default': 42}
+                'random_state': {'type': 'int', 'default': 42},
+                'use_stats_features_at_predict': {'type': 'bool', 'default': True}
             }
         }
@@ -1,5 +1,6 @@
 """Split Block - Train/test data splitting"""
 
+import numpy as np
 import pandas as pd
 from typing import Any, Dict, List
 from .base import BaseBlock, BlockOutput, BlockStatus
@@ -9,6 +10,35 @@ sys.path.append(str(Path(__file__).parent.parent))
 from utils.data_loader import DataLoader
 
 
+def encode_split(train_data: pd.DataFrame, test_data: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Integer-encode a train/test split once for every downstream block
+
+    Ids are coded against the sorted training ids, so a code is a row/column
+    index into the training user/item space; test ids unseen in training get
+    -1. Train rows come first in the concatenated arrays, followed by test.
+
+    Returns:
+    --------
+    encoded : dict with user_ids, item_ids (sorted training ids), int32
+        user_codes / item_codes, float32 rating, and train / test slices
+    """
+    n_train = len(train_data)
+    encoded = {'train': slice(0, n_train), 'test': slice(n_train, n_train + len(test_data))}
+
+    for col, key in (('user_id', 'user'), ('item_id', 'item')):
+        train_codes, ids = pd.factorize(train_data[col].to_numpy(), sort=True)
+        test_codes = pd.Index(ids).get_indexer(test_data[col].to_numpy())
+        encoded[f'{key}_ids'] = ids
+        encoded[f'{key}_codes'] = np.concatenate([train_codes, test_codes]).astype(np.int32)
+
+    encoded['rating'] = np.concatenate([
+        train_data['rating'].to_numpy(), test_data['rating'].to_numpy()
+    ]).astype(np.float32)
+
+    return encoded
+
+
 class SplitBlock(BaseBlock):
     """Split data into training and test sets"""
 
@@ -49,7 +79,11 @@ class SplitBlock(BaseBlock):
                 data={
                     'train_data': train_data,
                     'test_data': test_data,
-                    'split-data': {'train': train_data, 'test': test_data}
+                    'split-data': {
+                        'train': train_data,
+                        'test': test_data,
+                        'encoded': encode_split(train_data, test_data)
+                    }
                 },
                 metrics={
                     'train_size': len(train_data),
@@ -2,7 +2,7 @@
 
 import numpy as np
 import pandas as pd
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from .base import BaseBlock, BlockOutput, BlockStatus
 
 try:
@@ -11,12 +11,30 @@ try:
 except ImportError:
     XGBOOST_AVAILABLE = False
 
+try:
+    # CuPy is only present on GPU installs; it also tells us whether a device is usable
+    import cupy
+    CUDA_AVAILABLE = cupy.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    CUDA_AVAILABLE = False
+
+# Cells scored per inplace_predict call when building the predictions matrix
+PREDICT_BATCH_CELLS = 200_000
+
+# Boosting rounds evaluated per pass over a batch; larger ensembles are
+# scored in tree ranges so each range's trees stay cache-resident
+PREDICT_TREE_CHUNK = 256
+
 
 class XGBoostBlock(BaseBlock):
     """Gradient boosting decision trees for recommendations
 
     Uses XGBoost regression to predict user-item ratings.
     Features are created from user/item IDs and optional additional features.
+
+    With separable_trees every tree is constrained to either user-side or
+    item-side features, so the full predictions matrix is the sum of a
+    per-user and a per-item score and costs O(n_users + n_items) predictions.
     """
 
     def __init__(self, block_id: str, config=None):
@@ -26,6 +44,7 @@ class XGBoostBlock(BaseBlock):
         self.item_ids = None
         self.user_map = None
         self.item_map = None
+        self.feature_stats = None
 
     def configure(self, **kwargs) -> None:
         self.config.update(kwargs)
@@ -46,6 +65,27 @@ class XGBoostBlock(BaseBlock):
 
         return errors
 
+    def _resolve_device(self) -> str:
+        """
+        Normalized XGBoost device for training
+
+        'gpu' and 'cuda[:N]' (any case) select CUDA, but only when CuPy and a
+        device are available; anything else, or CUDA without a device,
+        falls back to 'cpu' with a warning.
+        """
+        requested = self.config.get('device') or ('cuda' if CUDA_AVAILABLE else 'cpu')
+        device = str(requested).strip().lower()
+        if device == 'gpu':
+            device = 'cuda'
+
+        if device.startswith('cuda'):
+            if CUDA_AVAILABLE:
+                return device
+            self.logger.warning("device=%r requested but CUDA/CuPy is unavailable; training on the CPU", requested)
+        elif device != 'cpu':
+            self.logger.warning("Unknown device %r; training on the CPU", requested)
+        return 'cpu'
+
     def execute(self, inputs: Dict[str, Any]) -> BlockOutput:
         self.status = BlockStatus.RUNNING
         try:
@@ -66,17 +106,28 @@ class XGBoostBlock(BaseBlock):
             user_features = inputs.get('user-features')
             item_features = inputs.get('item-features')
 
-            # Create user and item mappings
-            self.user_ids = sorted(train_data['user_id'].unique())
-            self.item_ids = sorted(train_data['item_id'].unique())
-            self.user_map = {uid: idx for idx, uid in enumerate(self.user_ids)}
-            self.item_map = {iid: idx for idx, iid in enumerate(self.item_ids)}
+            # Create user and item mappings, reusing SplitBlock's encoding when present
+            encoded = split_data.get('encoded') if split_data and 'train' in split_data else None
+            if encoded is not None:
+                self.user_ids = encoded['user_ids']
+                self.item_ids = encoded['item_ids']
+                codes = (encoded['user_codes'][encoded['train']], encoded['item_codes'][encoded['train']])
+            else:
+                # One C hashtable pass gives both the sorted ids and each row's index
+                user_codes, self.user_ids = pd.factorize(train_data['user_id'].to_numpy(), sort=True)
+                item_codes, self.item_ids = pd.factorize(train_data['item_id'].to_numpy(), sort=True)
+                codes = (user_codes, item_codes)
+            self.user_map = dict(zip(self.user_ids.tolist(), range(len(self.user_ids))))
+            self.item_map = dict(zip(self.item_ids.tolist(), range(len(self.item_ids))))
 
             # Build feature matrix
             X_train, y_train = self._create_features(
-                train_data, user_features, item_features
+                train_data, user_features, item_features, codes
             )
 
+            # Train on the GPU histogram backend when a CUDA device is present
+            device = self._resolve_device()
+
             # Configure XGBoost
             params = {
                 'n_estimators': self.config.get('n_estimators', 100),
@@ -86,15 +137,27 @@ class XGBoostBlock(BaseBlock):
                 'colsample_bytree': self.config.get('colsample_bytree', 0.8),
                 'objective': 'reg:squarederror',
                 'random_state': self.config.get('random_state', 42),
-                'n_jobs': -1
+                'tree_method': 'hist',
+                'device': device
             }
+            if device == 'cpu':
+                params['n_jobs'] = -1
+            if self.config.get('separable_trees', False):
+                # Native JSON form; the sklearn wrapper only accepts index lists with feature names
+                params['interaction_constraints'] = str([list(side) for side in self._feature_sides()])
 
             # Train model
             self.model = xgb.XGBRegressor(**params)
-            self.model.fit(X_train, y_train, verbose=False)
+            if device == 'cpu':
+                self.model.fit(X_train, y_train, verbose=False)
+            else:
+                # Device-resident inputs avoid a host-to-device copy inside fit
+                self.model.fit(cupy.asarray(X_train), cupy.asarray(y_train), verbose=False)
+                # Score the small NumPy batches (and any saved copy) on the CPU
+                self.model.set_params(device='cpu')
 
             # Generate predictions matrix
-            predictions = self._generate_predictions_matrix(user_features, item_features)
+            predictions = self._generate_predictions_matrix()
 
             # Get feature importance
             feature_importance = self.model.feature_importances_
@@ -106,6 +169,7 @@ class XGBoostBlock(BaseBlock):
                 'predictions': predictions,
                 'user_map': self.user_map,
                 'item_map': self.item_map,
+                'feature_stats': self.feature_stats,
                 'feature_importance': feature_importance.tolist()
             }
 
@@ -117,6 +181,7 @@ class XGBoostBlock(BaseBlock):
                 metrics={
                     'n_estimators': params['n_estimators'],
                     'max_depth': params['max_depth'],
+                    'device': device,
                     'n_users': len(self.user_ids),
                     'n_items': len(self.item_ids),
                     'n_training_samples': len(X_train),
@@ -127,7 +192,7 @@ class XGBoostBlock(BaseBlock):
             )
         except Exception as e:
             self.status = BlockStatus.FAILED
-            self.logger.error(f"XGBoost training failed: {str(e)}")
+            self.logger.error("XGBoost training failed: %s", e)
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.FAILED,
@@ -138,7 +203,8 @@ class XGBoostBlock(BaseBlock):
         self,
         data: pd.DataFrame,
         user_features: pd.DataFrame = None,
-        item_features: pd.DataFrame = None
+        item_features: pd.DataFrame = None,
+        codes: Optional[tuple] = None
     ) -> tuple:
         """Create feature matrix for XGBoost training
 
@@ -148,133 +214,205 @@ class XGBoostBlock(BaseBlock):
         - User statistics (avg rating, rating count)
         - Item statistics (avg rating, rating count)
         - Optional: additional user/item features
-        """
-        features_list = []
 
+        codes, when given, are precomputed (user_index, item_index) arrays for
+        the rows of data (see SplitBlock's encoded split). The per-user and
+        per-item tables behind every column are kept on self.feature_stats
+        so prediction sees the same features as training.
+        """
         # Basic user and item indices
-        user_indices = data['user_id'].map(self.user_map).values
-        item_indices = data['item_id'].map(self.item_map).values
-
-        features_list.append(user_indices.reshape(-1, 1))
-        features_list.append(item_indices.reshape(-1, 1))
-
-        # User statistics
-        user_stats = data.groupby('user_id')['rating'].agg(['mean', 'count']).reset_index()
-        user_stats.columns = ['user_id', 'user_avg_rating', 'user_rating_count']
-        data_with_stats = data.merge(user_stats, on='user_id', how='left')
-
-        features_list.append(data_with_stats['user_avg_rating'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['user_rating_count'].values.reshape(-1, 1))
-
-        # Item statistics
-        item_stats = data.groupby('item_id')['rating'].agg(['mean', 'count']).reset_index()
-        item_stats.columns = ['item_id', 'item_avg_rating', 'item_rating_count']
-        data_with_stats = data_with_stats.merge(item_stats, on='item_id', how='left')
-
-        features_list.append(data_with_stats['item_avg_rating'].values.reshape(-1, 1))
-        features_list.append(data_with_stats['item_rating_count'].values.reshape(-1, 1))
-
-        # Global mean rating
-        global_mean = data['rating'].mean()
-        features_list.append(np.full((len(data), 1), global_mean))
-
-        # Optional: Add user/item metadata features
-        if user_features is not None:
-            user_feat_cols = [c for c in user_features.columns if c != 'user_id']
-            if user_feat_cols:
-                data_with_stats = data_with_stats.merge(
-                    user_features[['user_id'] + user_feat_cols],
-                    on='user_id',
-                    how='left'
-                )
-                for col in user_feat_cols:
-                    features_list.append(data_with_stats[col].fillna(0).values.reshape(-1, 1))
-
-        if item_features is not None:
-            item_feat_cols = [c for c in item_features.columns if c != 'item_id']
-            if item_feat_cols:
-                data_with_stats = data_with_stats.merge(
-                    item_features[['item_id'] + item_feat_cols],
-                    on='item_id',
-                    how='left'
-                )
-                for col in item_feat_cols:
-                    features_list.append(data_with_stats[col].fillna(0).values.reshape(-1, 1))
-
-        X = np.hstack(features_list)
-        y = data['rating'].values
+        if codes is not None:
+            user_indices, item_indices = codes
+        else:
+            # Categorical codes against the known ids: a C hash lookup, -1 for unseen ids
+            user_indices = pd.Categorical(data['user_id'], categories=self.user_ids).codes.astype(np.int32)
+            item_indices = pd.Categorical(data['item_id'], categories=self.item_ids).codes.astype(np.int32)
+
+        ratings = data['rating'].to_numpy(dtype=np.float64)
+
+        # Per-user and per-item tables: (avg rating, rating count) and optional
+        # metadata, aligned to the id order (missing metadata is 0)
+        self.feature_stats = {'global_mean': float(ratings.mean())}
+        for side, indices, ids, meta in (('user', user_indices, self.user_ids, user_features),
+                                         ('item', item_indices, self.item_ids, item_features)):
+            self.feature_stats[side] = self._group_stats(indices, ratings, len(ids))
+
+            key = f'{side}_id'
+            feat_cols = [] if meta is None else [c for c in meta.columns if c != key]
+            self.feature_stats[f'{side}_meta'] = (
+                meta.drop_duplicates(key).set_index(key)[feat_cols].reindex(np.asarray(ids))
+                .fillna(0).to_numpy(dtype=np.float32)
+                if feat_cols else None
+            )
+
+        X = self._create_batch_features(user_indices, item_indices)
+        y = data['rating'].to_numpy(dtype=np.float32)
 
         return X, y
 
-    def _generate_predictions_matrix(
-        self,
-        user_features: pd.DataFrame = None,
-        item_features: pd.DataFrame = None
-    ) -> np.ndarray:
+    @staticmethod
+    def _group_stats(codes: np.ndarray, ratings: np.ndarray, n_groups: int) -> np.ndarray:
+        """Per-group (mean, count) table via bincount"""
+        counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+        sums = np.bincount(codes, weights=ratings, minlength=n_groups)
+        return np.column_stack([sums / np.maximum(counts, 1), counts]).astype(np.float32)
+
+    def _feature_sides(self) -> tuple:
+        """Column indices that depend only on the user and only on the item"""
+        n_user_meta = self._n_meta('user_meta')
+        n_item_meta = self._n_meta('item_meta')
+        user_cols = [0, 2, 3] + list(range(7, 7 + n_user_meta))
+        item_cols = [1, 4, 5] + list(range(7 + n_user_meta, 7 + n_user_meta + n_item_meta))
+        return user_cols, item_cols
+
+    def _n_meta(self, key: str) -> int:
+        table = self.feature_stats[key]
+        return 0 if table is None else table.shape[1]
+
+    def _separable_predictions(self) -> Optional[np.ndarray]:
+        """Predictions matrix from per-user and per-item tree sums
+
+        When no tree splits on both user-side and item-side features, each
+        tree's output depends on the user alone or on the item alone. Leaf
+        indices of one row per user and one row per item then give every
+        cell as base + user_score[u] + item_score[i]. Returns None if any
+        tree mixes the two sides.
+        """
+        booster = self.model.get_booster()
+        trees = booster.trees_to_dataframe()
+        n_trees = int(trees['Tree'].max()) + 1
+
+        user_cols, item_cols = self._feature_sides()
+        is_split = trees['Feature'] != 'Leaf'
+        split_cols = trees.loc[is_split, 'Feature'].str[1:].astype(int)
+        on_user = split_cols.isin(user_cols).groupby(trees.loc[is_split, 'Tree']).all()
+        on_item = split_cols.isin(item_cols).groupby(trees.loc[is_split, 'Tree']).all()
+        if not (on_user | on_item).all():
+            return None
+
+        # Stumps and constant-only trees score the same everywhere; count them as user trees
+        item_trees = np.zeros(n_trees, dtype=bool)
+        item_trees[on_item[on_item & ~on_user].index.to_numpy()] = True
+
+        # Leaf value of every (tree, node)
+        leaves = trees[~is_split]
+        leaf_values = np.zeros((n_trees, int(trees['Node'].max()) + 1))
+        leaf_values[leaves['Tree'].to_numpy(), leaves['Node'].to_numpy()] = leaves['Gain'].to_numpy()
+
+        n_users = len(self.user_ids)
+        n_items = len(self.item_ids)
+        tree_idx = np.arange(n_trees)
+
+        # One row per user (paired with item 0) and one per item (paired with user 0)
+        user_rows = self._create_batch_features(np.arange(n_users), np.zeros(n_users, dtype=np.int64))
+        item_rows = self._create_batch_features(np.zeros(n_items, dtype=np.int64), np.arange(n_items))
+        user_leaves = booster.predict(xgb.DMatrix(user_rows), pred_leaf=True).astype(np.int64)
+        item_leaves = booster.predict(xgb.DMatrix(item_rows), pred_leaf=True).astype(np.int64)
+        user_leaf_values = leaf_values[tree_idx, user_leaves.reshape(n_users, n_trees)]
+        item_leaf_values = leaf_values[tree_idx, item_leaves.reshape(n_items, n_trees)]
+
+        user_scores = user_leaf_values[:, ~item_trees].sum(axis=1)
+        item_scores = item_leaf_values[:, item_trees].sum(axis=1)
+
+        # The model's base score is whatever the trees do not account for
+        base = float(booster.inplace_predict(user_rows[:1])[0]) - user_leaf_values[0].sum()
+
+        return (base + user_scores[:, None] + item_scores[None, :]).astype(np.float32)
+
+    def _generate_predictions_matrix(self) -> np.ndarray:
         """Generate predictions for all user-item pairs"""
+        if self.config.get('separable_trees', False):
+            predictions = self._separable_predictions()
+            if predictions is not None:
+                return predictions
+
         n_users = len(self.user_ids)
         n_items = len(self.item_ids)
-        predictions = np.zeros((n_users, n_items))
+        predictions = np.empty((n_users, n_items), dtype=np.float32)
+        flat = predictions.reshape(-1)
 
-        # Create a synthetic dataset with all user-item combinations
-        # For efficiency, we'll do this in batches
-        batch_size = 10000
+        # Predict straight from the NumPy buffer; the booster's inplace path
+        # skips building (and quantizing into) a DMatrix for every batch
+        booster = self.model.get_booster()
 
-        all_pairs = []
-        for u_idx, user_id in enumerate(self.user_ids):
-            for i_idx, item_id in enumerate(self.item_ids):
-                all_pairs.append((u_idx, i_idx, user_id, item_id))
+        # Walk the row-major cell order in batches; (u, i) come from the flat position
+        batch_size = PREDICT_BATCH_CELLS
+        total = n_users * n_items
+        scratch = None
 
-        for batch_start in range(0, len(all_pairs), batch_size):
-            batch_end = min(batch_start + batch_size, len(all_pairs))
-            batch = all_pairs[batch_start:batch_end]
+        for batch_start in range(0, total, batch_size):
+            batch_end = min(batch_start + batch_size, total)
+            lin = np.arange(batch_start, batch_end, dtype=np.int64)
+            u_indices = lin // n_items
 
             batch_features = self._create_batch_features(
-                batch, user_features, item_features
+                u_indices, lin - u_indices * n_items, out=scratch
             )
+            scratch = batch_features
+            flat[batch_start:batch_end] = self._predict_in_tree_ranges(booster, batch_features)
 
-            batch_preds = self.model.predict(batch_features)
+        return predictions
 
-            for i, (u_idx, i_idx, _, _) in enumerate(batch):
-                predictions[u_idx, i_idx] = batch_preds[i]
+    @staticmethod
+    def _predict_in_tree_ranges(booster, features: np.ndarray) -> np.ndarray:
+        """inplace_predict accumulated over ranges of PREDICT_TREE_CHUNK rounds
 
-        return predictions
+        The first range carries the model's base score; later ranges get a
+        zero base margin so only their trees are added. The squared-error
+        objective has an identity link, so margins add up to the prediction.
+        """
+        n_rounds = booster.num_boosted_rounds()
+        if n_rounds <= PREDICT_TREE_CHUNK:
+            return booster.inplace_predict(features)
+
+        scores = booster.inplace_predict(
+            features, iteration_range=(0, PREDICT_TREE_CHUNK), predict_type='margin'
+        )
+        zero_margin = np.zeros(len(features), dtype=np.float32)
+        for start in range(PREDICT_TREE_CHUNK, n_rounds, PREDICT_TREE_CHUNK):
+            scores += booster.inplace_predict(
+                features, iteration_range=(start, min(start + PREDICT_TREE_CHUNK, n_rounds)),
+                predict_type='margin', base_margin=zero_margin
+            )
+        return scores
 
     def _create_batch_features(
         self,
-        batch: List[tuple],
-        user_features: pd.DataFrame = None,
-        item_features: pd.DataFrame = None
+        u_indices: np.ndarray,
+        i_indices: np.ndarray,
+        out: Optional[np.ndarray] = None
     ) -> np.ndarray:
-        """Create features for a batch of user-item pairs"""
-        features_list = []
-
-        u_indices = np.array([pair[0] for pair in batch])
-        i_indices = np.array([pair[1] for pair in batch])
+        """Create features for a batch of user-item index pairs
 
-        features_list.append(u_indices.reshape(-1, 1))
-        features_list.append(i_indices.reshape(-1, 1))
-
-        # For prediction, we'll use global statistics or zeros
-        # This is a simplification - in practice, you'd compute these from training data
-        features_list.append(np.zeros((len(batch), 1)))  # user_avg_rating placeholder
-        features_list.append(np.zeros((len(batch), 1)))  # user_rating_count placeholder
-        features_list.append(np.zeros((len(batch), 1)))  # item_avg_rating placeholder
-        features_list.append(np.zeros((len(batch), 1)))  # item_rating_count placeholder
-        features_list.append(np.full((len(batch), 1), 3.5))  # global_mean placeholder
-
-        # Add user/item features if available
-        if user_features is not None:
-            user_feat_cols = [c for c in user_features.columns if c != 'user_id']
-            for col in user_feat_cols:
-                features_list.append(np.zeros((len(batch), 1)))
-
-        if item_features is not None:
-            item_feat_cols = [c for c in item_features.columns if c != 'item_id']
-            for col in item_feat_cols:
-                features_list.append(np.zeros((len(batch), 1)))
-
-        return np.hstack(features_list)
+        Looks up the training tables in self.feature_stats, so the columns
+        match _create_features. out, when given, is the array returned by a
+        previous call (at least as long as this batch) and is overwritten.
+        """
+        stats = self.feature_stats
+        user_meta, item_meta = stats['user_meta'], stats['item_meta']
+
+        if out is None:
+            n_cols = 7
+            n_cols += 0 if user_meta is None else user_meta.shape[1]
+            n_cols += 0 if item_meta is None else item_meta.shape[1]
+            features = np.empty((len(u_indices), n_cols), dtype=np.float32)
+            features[:, 6] = stats['global_mean']
+        else:
+            features = out[:len(u_indices)]
+
+        features[:, 0] = u_indices
+        features[:, 1] = i_indices
+        # user avg/count, item avg/count
+        features[:, 2:4] = stats['user'][u_indices]
+        features[:, 4:6] = stats['item'][i_indices]
+
+        col = 7
+        for table, indices in ((user_meta, u_indices), (item_meta, i_indices)):
+            if table is not None:
+                features[:, col:col + table.shape[1]] = table[indices]
+                col += table.shape[1]
+
+        return features
 
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -292,6 +430,8 @@ class XGBoostBlock(BaseBlock):
                 'learning_rate': {'type': 'float', 'default': 0.1},
                 'subsample': {'type': 'float', 'default': 0.8},
                 'colsample_bytree': {'type': 'float', 'default': 0.8},
-                'random_state': {'type': 'int', 'default': 42}
+                'random_state': {'type': 'int', 'default': 42},
+                'device': {'type': 'str', 'default': None},
+                'separable_trees': {'type': 'bool', 'default': False}
             }
         }
@@ -45,76 +45,65 @@ class CVEvaluationBlock(BaseBlock):
             errors=[message]
         )
 
-    def _calculate_iou(self, bbox1: List, bbox2: List) -> float:
-        """Calculate Intersection over Union between two bounding boxes"""
-        x1, y1, w1, h1 = bbox1
-        x2, y2, w2, h2 = bbox2
+    def _calculate_iou(self, boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        """Calculate Intersection over Union between paired (n, 4) x/y/w/h boxes"""
+        x1, y1, w1, h1 = boxes1.T
+        x2, y2, w2, h2 = boxes2.T
 
-        x_left = max(x1, x2)
-        y_top = max(y1, y2)
-        x_right = min(x1 + w1, x2 + w2)
-        y_bottom = min(y1 + h1, y2 + h2)
+        # Branchless: disjoint boxes get a zero-width (or zero-height) overlap
+        inter_w = np.maximum(np.minimum(x1 + w1, x2 + w2) - np.maximum(x1, x2), 0)
+        inter_h = np.maximum(np.minimum(y1 + h1, y2 + h2) - np.maximum(y1, y2), 0)
 
-        if x_right < x_left or y_bottom < y_top:
-            return 0.0
+        intersection_area = inter_w * inter_h
+        union_area = w1 * h1 + w2 * h2 - intersection_area
 
-        intersection_area = (x_right - x_left) * (y_bottom - y_top)
-        bbox1_area = w1 * h1
-        bbox2_area = w2 * h2
-        union_area = bbox1_area + bbox2_area - intersection_area
+        return np.divide(intersection_area, union_area,
+                         out=np.zeros_like(intersection_area), where=union_area != 0)
 
-        if union_area == 0:
-            return 0.0
+    def _calculate_center_error(self, boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        """Calculate Euclidean distance between paired (n, 4) x/y/w/h box centers"""
+        x1, y1, w1, h1 = boxes1.T
+        x2, y2, w2, h2 = boxes2.T
 
-        return float(intersection_area / union_area)
+        return np.hypot((x1 + w1 / 2) - (x2 + w2 / 2), (y1 + h1 / 2) - (y2 + h2 / 2))
 
-    def _calculate_center_error(self, bbox1: List, bbox2: List) -> float:
-        """Calculate Euclidean distance between bbox centers"""
-        x1, y1, w1, h1 = bbox1
-        x2, y2, w2, h2 = bbox2
+    def _success_rates(self, ious: np.ndarray, thresholds) -> np.ndarray:
+        """Fraction of frames with IoU >= each threshold
 
-        center1 = [x1 + w1/2, y1 + h1/2]
-        center2 = [x2 + w2/2, y2 + h2/2]
-
-        dx = center1[0] - center2[0]
-        dy = center1[1] - center2[1]
-
-        return float(np.sqrt(dx**2 + dy**2))
+        One sort, then a binary search per threshold counts the frames at or
+        above it, instead of a scan over every frame per threshold.
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        if len(ious) == 0:
+            return np.zeros(len(thresholds))
+        below = np.searchsorted(np.sort(ious), thresholds, side='left')
+        return (len(ious) - below) / len(ious)
 
     def _compute_basic_stats(self, tracked_boxes: List) -> BlockOutput:
         """Compute basic statistics when no ground truth available"""
         if len(tracked_boxes) == 0:
             return self._error("No tracked boxes to evaluate")
 
-        areas = []
-        centers = []
-        aspect_ratios = []
+        # Keep the input dtype so integer boxes still report integer areas
+        boxes = np.asarray(tracked_boxes).reshape(-1, 4)
+        x, y, w, h = boxes.T
 
-        for bbox in tracked_boxes:
-            x, y, w, h = bbox
-            area = w * h
-            center = [x + w/2, y + h/2]
-            aspect_ratio = w / h if h > 0 else 0
+        areas = w * h
+        centers = np.column_stack([x + w / 2, y + h / 2])
+        aspect_ratios = np.divide(w, h, out=np.zeros(len(boxes)), where=h > 0)
 
-            areas.append(area)
-            centers.append(center)
-            aspect_ratios.append(aspect_ratio)
-
-        displacements = []
-        for i in range(1, len(centers)):
-            dx = centers[i][0] - centers[i-1][0]
-            dy = centers[i][1] - centers[i-1][1]
-            displacement = np.sqrt(dx**2 + dy**2)
-            displacements.append(displacement)
+        # Frame-to-frame center displacement
+        displacements = np.hypot(np.diff(centers[:, 0]), np.diff(centers[:, 1]))
+        has_motion = len(displacements) > 0
 
         results = {
             'n_frames': len(tracked_boxes),
             'avg_area': float(np.mean(areas)),
             'std_area': float(np.std(areas)),
             'avg_aspect_ratio': float(np.mean(aspect_ratios)),
-            'avg_displacement': float(np.mean(displacements)) if displacements else 0.0,
-            'max_displacement': float(np.max(displacements)) if displacements else 0.0,
-            'total_distance': float(np.sum(displacements)) if displacements else 0.0
+            'avg_displacement': float(np.mean(displacements)) if has_motion else 0.0,
+            'max_displacement': float(np.max(displacements)) if has_motion else 0.0,
+            'total_distance': float(np.sum(displacements)) if has_motion else 0.0
         }
 
         return BlockOutput(
@@ -122,9 +111,9 @@ class CVEvaluationBlock(BaseBlock):
             status=BlockStatus.COMPLETED,
             data={
                 'tracked_boxes': tracked_boxes,
-                'areas': areas,
-                'centers': centers,
-                'displacements': displacements
+                'areas': areas.tolist(),
+                'centers': centers.tolist(),
+                'displacements': displacements.tolist()
             },
             metrics=results
         )
@@ -145,63 +134,53 @@ class CVEvaluationBlock(BaseBlock):
             iou_thresholds = self.config.get('iou_thresholds', [0.3, 0.5, 0.7])
 
             results = {}
-            ious = []
-            center_errors = []
 
             n_frames = min(len(tracked_boxes), len(ground_truth))
 
-            for i in range(n_frames):
-                pred_bbox = tracked_boxes[i]
-                if isinstance(ground_truth[i], dict):
-                    gt_bbox = ground_truth[i]['bbox']
-                else:
-                    gt_bbox = ground_truth[i]
-
-                iou = self._calculate_iou(pred_bbox, gt_bbox)
-                ious.append(iou)
+            # Score every frame at once on (n_frames, 4) box arrays
+            pred_boxes = np.asarray(tracked_boxes[:n_frames], dtype=np.float64).reshape(-1, 4)
+            gt_boxes = np.asarray(
+                [gt['bbox'] if isinstance(gt, dict) else gt for gt in ground_truth[:n_frames]],
+                dtype=np.float64
+            ).reshape(-1, 4)
 
-                center_error = self._calculate_center_error(pred_bbox, gt_bbox)
-                center_errors.append(center_error)
+            ious = self._calculate_iou(pred_boxes, gt_boxes)
+            center_errors = self._calculate_center_error(pred_boxes, gt_boxes)
 
             if 'iou' in metrics_to_compute:
-                results['avg_iou'] = float(np.mean(ious))
-                results['min_iou'] = float(np.min(ious))
-                results['max_iou'] = float(np.max(ious))
-                results['std_iou'] = float(np.std(ious))
+                results['avg_iou'] = float(ious.mean())
+                results['min_iou'] = float(ious.min())
+                results['max_iou'] = float(ious.max())
+                results['std_iou'] = float(ious.std())
 
             if 'center_error' in metrics_to_compute:
-                results['avg_center_error'] = float(np.mean(center_errors))
+                results['avg_center_error'] = float(center_errors.mean())
                 results['median_center_error'] = float(np.median(center_errors))
-                results['max_center_error'] = float(np.max(center_errors))
+                results['max_center_error'] = float(center_errors.max())
 
             if 'precision' in metrics_to_compute:
-                for threshold in iou_thresholds:
-                    success_count = sum(1 for iou in ious if iou >= threshold)
-                    precision = success_count / len(ious) if len(ious) > 0 else 0.0
+                precisions = self._success_rates(ious, iou_thresholds)
+                for threshold, precision in zip(iou_thresholds, precisions):
                     results[f'precision@{threshold}'] = float(precision)
 
             if 'success_plot' in metrics_to_compute:
                 thresholds = np.linspace(0, 1, 21)
-                success_rates = []
-                for threshold in thresholds:
-                    success_count = sum(1 for iou in ious if iou >= threshold)
-                    success_rate = success_count / len(ious) if len(ious) > 0 else 0.0
-                    success_rates.append(success_rate)
+                success_rates = self._success_rates(ious, thresholds)
 
                 results['success_plot_thresholds'] = thresholds.tolist()
-                results['success_plot_rates'] = success_rates
+                results['success_plot_rates'] = success_rates.tolist()
                 results['auc'] = float(np.mean(success_rates))
 
             if 'recall' in metrics_to_compute:
-                recall_count = sum(1 for iou in ious if iou > 0)
+                recall_count = np.count_nonzero(ious > 0)
                 results['recall'] = float(recall_count / len(ious)) if len(ious) > 0 else 0.0
 
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.COMPLETED,
                 data={
-                    'ious': ious,
-                    'center_errors': center_errors,
+                    'ious': ious.tolist(),
+                    'center_errors': center_errors.tolist(),
                     'tracked_boxes': tracked_boxes,
                     'ground_truth': ground_truth
                 },
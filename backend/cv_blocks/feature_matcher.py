@@ -1,14 +1,34 @@
 """Feature Matching Block - Feature-based template matching"""
 
 import cv2
+import hashlib
 import numpy as np
-from typing import Dict, Any, List
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from backend.blocks.base import BaseBlock, BlockOutput, BlockStatus
 
 logger = logging.getLogger(__name__)
 
+# OpenCL (T-API) device for UMat dispatch, e.g. an integrated or discrete GPU
+OPENCL_AVAILABLE = cv2.ocl.haveOpenCL()
+
+# Keypoints/descriptors of recently seen grayscale images, so re-running a
+# pipeline on the same frames (or a template covering a whole frame) skips detection
+_DETECTION_CACHE_SIZE = 512
+_detection_cache: 'OrderedDict[Tuple, tuple]' = OrderedDict()
+_detection_lock = threading.Lock()
+
+
+def _image_key(method: str, gray: np.ndarray) -> Tuple:
+    """Cache key for a detector run: method plus a content hash of the image"""
+    gray = np.ascontiguousarray(gray)
+    return method, gray.shape, hashlib.blake2b(gray, digest_size=16).digest()
+
 
 class FeatureMatcherBlock(BaseBlock):
     """Feature-based template matching using keypoint descriptors"""
@@ -28,6 +48,9 @@ class FeatureMatcherBlock(BaseBlock):
         method = self.config.get('method', 'orb')
         if method not in ['orb', 'akaze', 'brisk', 'sift']:
             errors.append(f"Invalid method: {method}")
+        matcher = self.config.get('matcher', 'flann')
+        if matcher not in ['flann', 'bf']:
+            errors.append(f"Invalid matcher: {matcher}")
         return errors
 
     def get_schema(self):
@@ -61,6 +84,81 @@ class FeatureMatcherBlock(BaseBlock):
         else:
             return cv2.ORB_create()
 
+    def _create_matcher(self, method: str, matcher_type: str):
+        """Create descriptor matcher: approximate FLANN (default) or brute force"""
+        # _create_detector falls back to ORB when SIFT is unavailable
+        binary = method in ['orb', 'akaze', 'brisk'] or not hasattr(cv2, 'SIFT_create')
+        if matcher_type == 'bf':
+            return cv2.BFMatcher(cv2.NORM_HAMMING if binary else cv2.NORM_L2, crossCheck=False)
+
+        if binary:
+            # LSH index for binary descriptors
+            index_params = dict(algorithm=6, table_number=12, key_size=20, multi_probe_level=2)
+        else:
+            # Randomized KD-trees for float descriptors (SIFT)
+            index_params = dict(algorithm=1, trees=5)
+        return cv2.FlannBasedMatcher(index_params, dict(checks=50))
+
+    def _detect_frames(self, method: str, frames_gray: List[np.ndarray]) -> List[tuple]:
+        """Detect keypoints and descriptors for every frame
+
+        Images already detected with the same method are served from the
+        module cache. The rest are spread over a thread pool (OpenCV releases
+        the GIL during detection); each worker thread gets its own detector
+        because the detectors are not thread-safe. When an OpenCL device is
+        available (or use_opencl is set) images are passed as UMat so OpenCV
+        can run detection on it.
+        """
+        keys = [_image_key(method, gray) for gray in frames_gray]
+        with _detection_lock:
+            features = {key: _detection_cache[key] for key in keys if key in _detection_cache}
+            for key in features:
+                _detection_cache.move_to_end(key)
+
+        # First occurrence of each uncached image
+        missing = {}
+        for key, gray in zip(keys, frames_gray):
+            if key not in features:
+                missing.setdefault(key, gray)
+
+        use_opencl = self.config.get('use_opencl')
+        if use_opencl is None:
+            use_opencl = OPENCL_AVAILABLE
+
+        def detect_with(detector, gray):
+            if not use_opencl:
+                return detector.detectAndCompute(gray, None)
+            # UMat input dispatches detection to the OpenCL device; bring descriptors back
+            keypoints, descriptors = detector.detectAndCompute(cv2.UMat(gray), None)
+            if isinstance(descriptors, cv2.UMat):
+                descriptors = descriptors.get()
+            return keypoints, descriptors
+
+        if missing:
+            n_workers = min(self.config.get('n_workers') or os.cpu_count() or 1, len(missing))
+            if n_workers <= 1:
+                detector = self._create_detector(method)
+                detected = [detect_with(detector, gray) for gray in missing.values()]
+            else:
+                local = threading.local()
+
+                def detect(gray):
+                    if not hasattr(local, 'detector'):
+                        local.detector = self._create_detector(method)
+                    return detect_with(local.detector, gray)
+
+                with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    detected = list(executor.map(detect, missing.values()))
+
+            features.update(zip(missing, detected))
+            with _detection_lock:
+                for key, result in zip(missing, detected):
+                    _detection_cache[key] = result
+                while len(_detection_cache) > _DETECTION_CACHE_SIZE:
+                    _detection_cache.popitem(last=False)
+
+        return [features[key] for key in keys]
+
     def execute(self, inputs: Dict[str, Any]) -> BlockOutput:
         """Perform feature-based template matching"""
         try:
@@ -76,35 +174,35 @@ class FeatureMatcherBlock(BaseBlock):
             min_matches = self.config.get('min_matches', 10)
             ratio_thresh = self.config.get('ratio_threshold', 0.75)
 
-            # Create feature detector
-            detector = self._create_detector(method)
+            # Convert every frame to grayscale once; the template is a crop of frame 0
+            frames_gray = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
 
             # Extract initial template
             x, y, w, h = init_bbox
             template = frames[0][y:y+h, x:x+w]
-            template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+            template_gray = frames_gray[0][y:y+h, x:x+w]
 
             # Detect keypoints and compute descriptors for template
-            kp_template, des_template = detector.detectAndCompute(template_gray, None)
+            kp_template, des_template = self._detect_frames(method, [template_gray])[0]
 
             if des_template is None or len(kp_template) < min_matches:
                 return self._error(f"Insufficient keypoints in template: {len(kp_template) if kp_template else 0}")
 
+            # Template keypoint coordinates never change; convert them once
+            template_pts = cv2.KeyPoint_convert(kp_template)
+
             # Create matcher
-            if method in ['orb', 'akaze', 'brisk']:
-                matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-            else:
-                matcher = cv2.BFMatcher(cv2.NORM_L2, crossCheck=False)
+            matcher = self._create_matcher(method, self.config.get('matcher', 'flann'))
+
+            # Detect features in all frames up front; matching below stays serial
+            frame_features = self._detect_frames(method, frames_gray)
 
             # Track through frames
             tracked_boxes = []
             match_counts = []
             confidence_scores = []
 
-            for frame_idx, frame in enumerate(frames):
-                frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                kp_frame, des_frame = detector.detectAndCompute(frame_gray, None)
-
+            for frame, (kp_frame, des_frame) in zip(frames, frame_features):
                 if des_frame is None or len(kp_frame) < min_matches:
                     if len(tracked_boxes) > 0:
                         tracked_boxes.append(tracked_boxes[-1])
@@ -117,19 +215,25 @@ class FeatureMatcherBlock(BaseBlock):
                 # Match descriptors
                 matches = matcher.knnMatch(des_template, des_frame, k=2)
 
+                # Unpack the DMatch pairs once into parallel columns:
+                # best distance, second distance, template index, frame index
+                pairs = np.array(
+                    [(m.distance, n.distance, m.queryIdx, m.trainIdx)
+                     for m, n in (match_pair for match_pair in matches if len(match_pair) == 2)],
+                    dtype=np.float64
+                ).reshape(-1, 4)
+
                 # Apply ratio test
-                good_matches = []
-                for match_pair in matches:
-                    if len(match_pair) == 2:
-                        m, n = match_pair
-                        if m.distance < ratio_thresh * n.distance:
-                            good_matches.append(m)
+                good = pairs[pairs[:, 0] < ratio_thresh * pairs[:, 1]]
+                n_good = len(good)
 
-                match_counts.append(len(good_matches))
+                match_counts.append(n_good)
 
-                if len(good_matches) >= min_matches:
-                    src_pts = np.float32([kp_template[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                    dst_pts = np.float32([kp_frame[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+                if n_good >= min_matches:
+                    query_idx = good[:, 2].astype(np.intp)
+                    train_idx = good[:, 3].astype(np.intp)
+                    src_pts = template_pts[query_idx].reshape(-1, 1, 2)
+                    dst_pts = cv2.KeyPoint_convert(kp_frame, keypointIndexes=train_idx).reshape(-1, 1, 2)
 
                     H, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
 
@@ -149,13 +253,13 @@ class FeatureMatcherBlock(BaseBlock):
                         y_max = min(frame.shape[0], y_max)
 
                         bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
-                        confidence = len(good_matches) / len(kp_template)
+                        confidence = n_good / len(kp_template)
                     else:
                         bbox = tracked_boxes[-1] if len(tracked_boxes) > 0 else init_bbox
                         confidence = 0.5
                 else:
                     bbox = tracked_boxes[-1] if len(tracked_boxes) > 0 else init_bbox
-                    confidence = len(good_matches) / min_matches if min_matches > 0 else 0.0
+                    confidence = n_good / min_matches if min_matches > 0 else 0.0
 
                 tracked_boxes.append(bbox)
                 confidence_scores.append(float(confidence))
@@ -0,0 +1,91 @@
+"""Frame Pipeline - Prefetch and prepare frames on a reader thread"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_DONE = object()
+
+
+def prefetch_frames(
+    frames: Iterable[Any],
+    prepare: Optional[Callable[[Any], Any]] = None,
+    depth: int = 8
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Yield (frame, prepare(frame)) in order, produced by a background reader thread
+
+    The reader pulls frames (e.g. decoding a lazy video source) and runs
+    prepare on them while the caller is still busy with earlier frames; a
+    bounded queue keeps at most depth frames ahead. The caller's loop body
+    (tracker updates, template swaps) stays on its own thread, so stateful
+    OpenCV objects are never shared. prepare should be work that releases
+    the GIL, such as OpenCV transforms.
+
+    Parameters:
+    -----------
+    frames : iterable of frames
+    prepare : optional per-frame function run on the reader thread
+        (None yields (frame, None))
+    depth : maximum number of prepared frames waiting in the queue
+    """
+    ready: 'queue.Queue' = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Give up if the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read() -> None:
+        try:
+            for frame in frames:
+                if not put((frame, prepare(frame) if prepare is not None else None)):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put((_DONE, e))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _DONE:
+                return
+            if item[0] is _DONE:
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def key_frame_indices(n_frames: int, skip: int) -> List[int]:
+    """Frames processed when only every skip-th frame is run: 0, skip, 2*skip, ... plus the last"""
+    indices = list(range(0, n_frames, max(1, skip)))
+    if indices and indices[-1] != n_frames - 1:
+        indices.append(n_frames - 1)
+    return indices
+
+
+def interpolate_boxes(key_idx: List[int], key_boxes: np.ndarray, n_frames: int) -> np.ndarray:
+    """Linearly interpolate (n_key, 4) [x, y, w, h] boxes known on key frames to every frame"""
+    frame_idx = np.arange(n_frames)
+    boxes = np.empty((n_frames, 4), dtype=key_boxes.dtype)
+    for c in range(4):
+        boxes[:, c] = np.interp(frame_idx, key_idx, key_boxes[:, c]).round()
+    return boxes
+
+
+def hold_values(key_idx: List[int], key_values: np.ndarray, n_frames: int) -> np.ndarray:
+    """Carry each key frame's value forward over the skipped frames after it"""
+    positions = np.searchsorted(key_idx, np.arange(n_frames), side='right') - 1
+    return key_values[positions]
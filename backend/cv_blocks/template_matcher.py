@@ -6,9 +6,134 @@ from typing import Dict, Any, List
 import logging
 
 from backend.blocks.base import BaseBlock, BlockOutput, BlockStatus
+from backend.cv_blocks.frame_pipeline import (
+    hold_values, interpolate_boxes, key_frame_indices, prefetch_frames
+)
 
 logger = logging.getLogger(__name__)
 
+# Template area (pixels) from which matching switches to cached-spectrum FFT correlation
+FFT_MIN_TEMPLATE_AREA = 18 * 18
+
+
+def _as_float32(image: np.ndarray) -> np.ndarray:
+    return image.astype(np.float32, copy=False)
+
+
+class FFTTemplateMatcher:
+    """
+    cv2.matchTemplate for a fixed frame size via DFT correlation
+
+    The template's spectrum is computed once per template and reused for
+    every frame, so each frame costs one forward DFT per channel, one
+    spectrum product per channel and a single inverse DFT. Window sums for
+    the normalized and squared-difference methods come from integral
+    images, and the normalization follows OpenCV's matchTemplate.
+
+    Parameters:
+    -----------
+    frame_shape : shape of the frames to be matched (H, W) or (H, W, C)
+    template : initial template with the frames' channel count
+    method : one of the cv2.TM_* constants
+    """
+
+    def __init__(self, frame_shape: tuple, template: np.ndarray, method: int):
+        self.method = method
+        self.frame_h, self.frame_w = frame_shape[:2]
+        self.n_channels = frame_shape[2] if len(frame_shape) == 3 else 1
+        self.dft_h = cv2.getOptimalDFTSize(self.frame_h)
+        self.dft_w = cv2.getOptimalDFTSize(self.frame_w)
+        # Zero-padded per-channel scratch; only the frame region is ever rewritten
+        self._padded = np.zeros((self.dft_h, self.dft_w), dtype=np.float32)
+        self.set_template(template)
+
+    def _channels(self, image: np.ndarray) -> List[np.ndarray]:
+        return [image] if image.ndim == 2 else [image[:, :, c] for c in range(image.shape[2])]
+
+    def set_template(self, template: np.ndarray) -> None:
+        """Cache the spectrum (and norms) of a new template"""
+        template = template.astype(np.float64)
+        self.h, self.w = template.shape[:2]
+        channels = self._channels(template)
+
+        if self.method in (cv2.TM_CCOEFF, cv2.TM_CCOEFF_NORMED):
+            # Correlating with the zero-mean template drops the window-mean term
+            channels = [c - c.mean() for c in channels]
+        self.templ_sq_sum = float(sum((c * c).sum() for c in channels))
+
+        self.templ_spectra = []
+        for channel in channels:
+            padded = np.zeros((self.dft_h, self.dft_w), dtype=np.float32)
+            padded[:self.h, :self.w] = channel
+            self.templ_spectra.append(cv2.dft(padded))
+
+    def _window_sums(self, integral: np.ndarray) -> np.ndarray:
+        """Sum over every h x w window from an (H+1, W+1[, C]) integral image"""
+        h, w = self.h, self.w
+        return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+    def prepare(self, frame: np.ndarray) -> tuple:
+        """
+        Template-independent per-frame work: channel spectra and integral images
+
+        Safe to run ahead of match (e.g. on a reader thread) because it does
+        not depend on the current template, but it reuses one padding buffer,
+        so only one thread may call it.
+        """
+        spectra = []
+        for channel in self._channels(frame):
+            self._padded[:self.frame_h, :self.frame_w] = channel
+            spectra.append(cv2.dft(self._padded))
+
+        integrals = None
+        if self.method not in (cv2.TM_CCORR, cv2.TM_CCOEFF):
+            integrals = cv2.integral2(frame, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        return spectra, integrals
+
+    def match(self, frame: np.ndarray, prepared: tuple = None) -> np.ndarray:
+        """Match the current template against one frame, like cv2.matchTemplate"""
+        method = self.method
+        frame_spectra, integrals = prepared if prepared is not None else self.prepare(frame)
+        spectrum = None
+        for frame_spectrum, templ_spectrum in zip(frame_spectra, self.templ_spectra):
+            product = cv2.mulSpectrums(frame_spectrum, templ_spectrum, 0, conjB=True)
+            spectrum = product if spectrum is None else spectrum + product
+
+        result_h = self.frame_h - self.h + 1
+        result_w = self.frame_w - self.w + 1
+        corr = cv2.idft(spectrum, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)[:result_h, :result_w]
+        if method in (cv2.TM_CCORR, cv2.TM_CCOEFF):
+            return np.ascontiguousarray(corr)
+
+        corr = corr.astype(np.float64)
+        sums, sq_sums = integrals
+        wnd_sq_sum = self._window_sums(sq_sums)
+        if wnd_sq_sum.ndim == 3:
+            wnd_sq_sum = wnd_sq_sum.sum(axis=2)
+
+        if method == cv2.TM_CCOEFF_NORMED:
+            wnd_sum = self._window_sums(sums).reshape(result_h, result_w, -1)
+            wnd_sq_sum = wnd_sq_sum - (wnd_sum * wnd_sum).sum(axis=2) / (self.h * self.w)
+
+        if method in (cv2.TM_SQDIFF, cv2.TM_SQDIFF_NORMED):
+            num = np.maximum(wnd_sq_sum - 2 * corr + self.templ_sq_sum, 0)
+            if method == cv2.TM_SQDIFF:
+                return num.astype(np.float32)
+        else:
+            num = corr
+
+        # Same guard as OpenCV: ratios just past +-1 from rounding clamp to +-1,
+        # anything beyond becomes 0 (1 for SQDIFF_NORMED)
+        denom = np.sqrt(np.maximum(wnd_sq_sum, 0) * self.templ_sq_sum)
+        abs_num = np.abs(num)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.where(
+                abs_num < denom, num / denom,
+                np.where(abs_num < denom * 1.125, np.sign(num),
+                         1.0 if method == cv2.TM_SQDIFF_NORMED else 0.0)
+            )
+        return result.astype(np.float32)
+
 
 class TemplateMatcherBlock(BaseBlock):
     """Template matching using various OpenCV methods"""
@@ -37,6 +162,12 @@ class TemplateMatcherBlock(BaseBlock):
         method = self.config.get('method', 'ccoeff_normed')
         if method not in self.METHODS:
             errors.append(f"Invalid method: {method}")
+        skip = self.config.get('skip_frames', 1)
+        if not isinstance(skip, int) or skip < 1:
+            errors.append(f"skip_frames must be a positive integer, got {skip}")
+        search_pad = self.config.get('search_pad')
+        if search_pad is not None and (not isinstance(search_pad, int) or search_pad < 0):
+            errors.append(f"search_pad must be a non-negative integer, got {search_pad}")
         return errors
 
     def get_schema(self):
@@ -53,6 +184,14 @@ class TemplateMatcherBlock(BaseBlock):
             errors=[message]
         )
 
+    @staticmethod
+    def _best_match(result: np.ndarray, method: int):
+        """Top-left location and score of the best match in a matchTemplate score map"""
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if method in (cv2.TM_SQDIFF, cv2.TM_SQDIFF_NORMED):
+            return min_loc, 1.0 - min_val
+        return max_loc, max_val
+
     def execute(self, inputs: Dict[str, Any]) -> BlockOutput:
         """Perform template matching on video frames"""
         try:
@@ -68,6 +207,10 @@ class TemplateMatcherBlock(BaseBlock):
             method = self.METHODS[method_name]
             update_template = self.config.get('update_template', False)
             update_freq = self.config.get('update_frequency', 10)
+            skip = self.config.get('skip_frames', 1)
+            search_pad = self.config.get('search_pad')
+            reacquire_score = self.config.get('reacquire_score', 0.5)
+            normed = method in (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED, cv2.TM_SQDIFF_NORMED)
 
             # Extract initial template
             x, y, w, h = init_bbox
@@ -76,52 +219,96 @@ class TemplateMatcherBlock(BaseBlock):
             if template.size == 0:
                 return self._error("Invalid initial bounding box")
 
-            # Track object through frames
-            tracked_boxes = []
-            match_scores = []
+            # Large templates correlate in the frequency domain with a cached template spectrum
+            fft_matcher = None
+            if self.config.get('use_fft', True) and w * h >= FFT_MIN_TEMPLATE_AREA:
+                fft_matcher = FFTTemplateMatcher(frames[0].shape, template, method)
+
+            # Only key frames are matched; skipped frames are interpolated afterwards
+            key_idx = key_frame_indices(len(frames), skip)
+
+            # Track object through frames, writing results in place
+            tracked_boxes = np.empty((len(key_idx), 4), dtype=np.int32)
+            match_scores = np.empty(len(key_idx), dtype=np.float64)
+            result = None
+            roi_result = None
+            last_update = 0
+            n_full_searches = 0
+            frame_h, frame_w = frames[0].shape[:2]
+
+            # Frame spectra (FFT) or float32 copies (spatial and ROI search) are
+            # made on a reader thread while earlier frames are matched; matchTemplate
+            # runs faster on float32 input than on 8-bit, so each frame is cast once
+            float_frames = fft_matcher is None or search_pad is not None
+            prepare = _as_float32 if float_frames else fft_matcher.prepare
+            template_f32 = _as_float32(template) if float_frames else None
+            key_frames = prefetch_frames([frames[i] for i in key_idx], prepare)
 
-            for frame_idx, frame in enumerate(frames):
-                # Perform template matching
-                result = cv2.matchTemplate(frame, template, method)
+            for k, (frame_idx, (frame, prepared)) in enumerate(zip(key_idx, key_frames)):
+                match = None
+                if search_pad is not None and k > 0:
+                    # Search a padded window around the previous box first
+                    x0, y0 = max(0, x - search_pad), max(0, y - search_pad)
+                    x1, y1 = min(frame_w, x + w + search_pad), min(frame_h, y + h + search_pad)
+                    roi_result = cv2.matchTemplate(prepared[y0:y1, x0:x1], template_f32, method,
+                                                   result=roi_result)
+                    (roi_x, roi_y), score = self._best_match(roi_result, method)
 
-                # Find best match
-                if method in [cv2.TM_SQDIFF, cv2.TM_SQDIFF_NORMED]:
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                    top_left = min_loc
-                    score = 1.0 - min_val
-                else:
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                    top_left = max_loc
-                    score = max_val
+                    # A peak on an inner window edge means the object may have left the
+                    # window, and a weak normalized score means it was lost: re-acquire
+                    on_edge = ((roi_x == 0 and x0 > 0) or (roi_y == 0 and y0 > 0)
+                               or (roi_x == roi_result.shape[1] - 1 and x1 < frame_w)
+                               or (roi_y == roi_result.shape[0] - 1 and y1 < frame_h))
+                    if not on_edge and not (normed and score < reacquire_score):
+                        match = (x0 + roi_x, y0 + roi_y), score
+
+                if match is None:
+                    # Perform template matching over the full frame
+                    n_full_searches += 1
+                    if fft_matcher is not None:
+                        result = fft_matcher.match(frame, None if float_frames else prepared)
+                    else:
+                        # Write into the previous frame's score map (OpenCV reallocates on a size change)
+                        result = cv2.matchTemplate(prepared, template_f32, method, result=result)
+                    match = self._best_match(result, method)
 
                 # Calculate bounding box
-                x, y = top_left
-                bbox = [x, y, w, h]
-                tracked_boxes.append(bbox)
-                match_scores.append(float(score))
-
-                # Update template periodically if enabled
-                if update_template and frame_idx % update_freq == 0 and frame_idx > 0:
-                    x, y, w, h = bbox
+                (x, y), score = match
+                tracked_boxes[k] = (x, y, w, h)
+                match_scores[k] = score
+
+                # Update template periodically if enabled (on the first key frame due)
+                if update_template and frame_idx - last_update >= update_freq:
+                    last_update = frame_idx
                     if (x >= 0 and y >= 0 and x + w <= frame.shape[1] and y + h <= frame.shape[0]):
                         template = frame[y:y+h, x:x+w]
+                        if fft_matcher is not None:
+                            fft_matcher.set_template(template)
+                        if float_frames:
+                            template_f32 = prepared[y:y+h, x:x+w]
+
+            if skip > 1:
+                tracked_boxes = interpolate_boxes(key_idx, tracked_boxes, len(frames))
+                match_scores = hold_values(key_idx, match_scores, len(frames))
 
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.COMPLETED,
                 data={
-                    'tracked_boxes': tracked_boxes,
-                    'match_scores': match_scores,
+                    'tracked_boxes': tracked_boxes.tolist(),
+                    'match_scores': match_scores.tolist(),
                     'template': template,
                     'frames': frames
                 },
                 metrics={
                     'method': method_name,
                     'n_frames': len(frames),
-                    'avg_match_score': float(np.mean(match_scores)),
-                    'min_match_score': float(np.min(match_scores)),
-                    'max_match_score': float(np.max(match_scores)),
-                    'template_updated': update_template
+                    'avg_match_score': float(match_scores.mean()),
+                    'min_match_score': float(match_scores.min()),
+                    'max_match_score': float(match_scores.max()),
+                    'template_updated': update_template,
+                    'n_matched_frames': len(key_idx),
+                    'n_full_searches': n_full_searches
                 }
             )
 
@@ -5,11 +5,88 @@ import numpy as np
 from typing import Dict, Any, List
 import logging
 
+from joblib import Parallel, delayed
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from backend.blocks.base import BaseBlock, BlockOutput, BlockStatus
+from backend.cv_blocks.frame_pipeline import (
+    hold_values, interpolate_boxes, key_frame_indices, prefetch_frames
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _box_iou(box_a, box_b) -> float:
+    """IoU of two [x, y, w, h] boxes"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _relocate(frame: np.ndarray, template: np.ndarray) -> List[int]:
+    """Box of the best normalized squared-difference match of template in frame"""
+    result = cv2.matchTemplate(frame, template, cv2.TM_SQDIFF_NORMED)
+    _, _, (x, y), _ = cv2.minMaxLoc(result)
+    h, w = template.shape[:2]
+    return [x, y, w, h]
+
+
+def _postprocess_boxes(raw_boxes, raw_success, frame_h, frame_w):
+    """
+    Clamp raw tracker boxes to the frame and score them, one row per key frame
+
+    Row 0 is the initial box. A successful update is truncated to integers,
+    clipped to the frame and scored by its area ratio to the previous box; a
+    failed one repeats the previous box with confidence 0.
+    """
+    n = raw_boxes.shape[0]
+    boxes = np.empty((n, 4), dtype=np.int32)
+    confidence = np.empty(n, dtype=np.float64)
+    for c in range(4):
+        boxes[0, c] = int(raw_boxes[0, c])
+    confidence[0] = 1.0
+
+    for k in range(1, n):
+        if not raw_success[k]:
+            for c in range(4):
+                boxes[k, c] = boxes[k - 1, c]
+            confidence[k] = 0.0
+            continue
+
+        x = max(0, int(raw_boxes[k, 0]))
+        y = max(0, int(raw_boxes[k, 1]))
+        w = max(1, int(raw_boxes[k, 2]))
+        h = max(1, int(raw_boxes[k, 3]))
+        if x + w > frame_w:
+            w = frame_w - x
+        if y + h > frame_h:
+            h = frame_h - y
+        boxes[k, 0] = x
+        boxes[k, 1] = y
+        boxes[k, 2] = w
+        boxes[k, 3] = h
+
+        prev_area = int(boxes[k - 1, 2]) * int(boxes[k - 1, 3])
+        curr_area = w * h
+        confidence[k] = min(curr_area, prev_area) / max(curr_area, prev_area)
+
+    return boxes, confidence
+
+
+if NUMBA_AVAILABLE:
+    # nogil lets windowed tracking post-process tracklets on several threads at once
+    _postprocess_boxes = njit(cache=True, nogil=True)(_postprocess_boxes)
+
+
 class TrackerBlock(BaseBlock):
     """Object tracking using various OpenCV trackers"""
 
@@ -28,6 +105,12 @@ class TrackerBlock(BaseBlock):
         tracker_type = self.config.get('tracker_type', 'kcf')
         if tracker_type not in ['kcf', 'csrt', 'medianflow', 'mosse', 'mil', 'boosting', 'tld']:
             errors.append(f"Invalid tracker: {tracker_type}")
+        window_size = self.config.get('window_size')
+        if window_size is not None and (not isinstance(window_size, int) or window_size < 1):
+            errors.append(f"window_size must be a positive integer, got {window_size}")
+        skip = self.config.get('skip_frames', 1)
+        if not isinstance(skip, int) or skip < 1:
+            errors.append(f"skip_frames must be a positive integer, got {skip}")
         return errors
 
     def get_schema(self):
@@ -81,6 +164,114 @@ class TrackerBlock(BaseBlock):
                 logger.error(f"Could not create tracker: {e}")
                 return None
 
+    def _track_window(self, tracker, frames, init_bbox, reinit_on_fail: bool):
+        """
+        Track one run of frames starting from init_bbox on its first frame
+
+        With skip_frames = k > 1 the tracker only sees every k-th frame (and
+        the last); boxes on the frames in between are linearly interpolated
+        and success/confidence carry over from the preceding key frame.
+
+        Returns (tracked_boxes, tracking_success, confidence_scores) as
+        (n, 4) int32, (n,) bool and (n,) float64 arrays with one row per
+        frame, or None if the tracker fails to initialize.
+        """
+        skip = self.config.get('skip_frames', 1)
+        x, y, w, h = init_bbox
+        if not tracker.init(frames[0], (x, y, w, h)):
+            return None
+
+        # Raw tracker outputs are collected first and post-processed in one pass
+        key_idx = key_frame_indices(len(frames), skip)
+        raw_boxes = np.empty((len(key_idx), 4), dtype=np.float64)
+        tracking_success = np.empty(len(key_idx), dtype=bool)
+        raw_boxes[0] = init_bbox
+        tracking_success[0] = True
+
+        # Key frames after the first are fetched on a reader thread while the tracker updates
+        frame_iter = prefetch_frames([frames[i] for i in key_idx[1:]])
+        for k, (frame, _) in enumerate(frame_iter, start=1):
+            success, bbox = tracker.update(frame)
+            tracking_success[k] = success
+            if success:
+                raw_boxes[k] = bbox
+
+        # Failed updates hold the last box (reinit_on_fail keeps the same placeholder)
+        frame_h, frame_w = frames[0].shape[:2]
+        tracked_boxes, confidence_scores = _postprocess_boxes(
+            raw_boxes, tracking_success, frame_h, frame_w
+        )
+
+        if skip > 1:
+            tracked_boxes = interpolate_boxes(key_idx, tracked_boxes, len(frames))
+            tracking_success = hold_values(key_idx, tracking_success, len(frames))
+            confidence_scores = hold_values(key_idx, confidence_scores, len(frames))
+
+        return tracked_boxes, tracking_success, confidence_scores
+
+    def _track_windowed(self, tracker, frames, init_bbox, tracker_type: str,
+                        reinit_on_fail: bool, window_size: int):
+        """
+        Track fixed-size windows of frames in parallel and stitch the tracklets
+
+        Consecutive windows share their boundary frame. Every window after
+        the first is seeded independently by relocating the initial template
+        on its first frame, so all windows can run at once. Stitching then
+        walks the boundaries in order: when the previous tracklet's box on the
+        shared frame overlaps the next window's seed by at least stitch_iou,
+        the tracklets are joined; otherwise that window is re-tracked from
+        the previous box, exactly as sequential tracking would.
+
+        Trade-off: windows that stitch cleanly run concurrently, but their
+        trackers restart from a relocalized box with no appearance history,
+        so boxes can differ from a single sequential pass. A window whose
+        seed disagrees with the running track costs a second, sequential
+        pass over it. window_size=None keeps the fully sequential behaviour.
+
+        Returns (tracked_boxes, tracking_success, confidence_scores,
+        n_windows, n_retracked_windows), or None if a tracker fails to
+        initialize. tracker is used for the first window.
+        """
+        n_jobs = self.config.get('n_jobs', 4)
+        stitch_iou = self.config.get('stitch_iou', 0.5)
+        last = len(frames) - 1
+        starts = list(range(0, last, window_size))
+        windows = [frames[start:min(start + window_size, last) + 1] for start in starts]
+
+        x, y, w, h = init_bbox
+        template = frames[0][y:y+h, x:x+w]
+        seeds = [list(init_bbox)] + [_relocate(window[0], template) for window in windows[1:]]
+
+        trackers = [tracker] + [self._create_tracker(tracker_type) for _ in windows[1:]]
+
+        tracklets = Parallel(n_jobs=n_jobs, backend='threading')(
+            delayed(self._track_window)(window_tracker, window, seed, reinit_on_fail)
+            for window_tracker, window, seed in zip(trackers, windows, seeds)
+        )
+        if tracklets[0] is None:
+            return None
+
+        stitched = tracklets[:1]
+        n_retracked = 0
+        for window, seed, tracklet in zip(windows[1:], seeds[1:], tracklets[1:]):
+            boundary_box = stitched[-1][0][-1].tolist()
+            if tracklet is None or _box_iou(boundary_box, seed) < stitch_iou:
+                tracklet = self._track_window(
+                    self._create_tracker(tracker_type), window, boundary_box, reinit_on_fail
+                )
+                n_retracked += 1
+                if tracklet is None:
+                    return None
+
+            stitched.append(tracklet)
+
+        # The boundary frame already has its box from the previous tracklet
+        trimmed = stitched[:1] + [[part[1:] for part in tracklet] for tracklet in stitched[1:]]
+        tracked_boxes, tracking_success, confidence_scores = (
+            np.concatenate(parts) for parts in zip(*trimmed)
+        )
+        return tracked_boxes, tracking_success, confidence_scores, len(windows), n_retracked
+
     def execute(self, inputs: Dict[str, Any]) -> BlockOutput:
         """Perform object tracking"""
         try:
@@ -94,80 +285,44 @@ class TrackerBlock(BaseBlock):
 
             tracker_type = self.config.get('tracker_type', 'kcf')
             reinit_on_fail = self.config.get('reinit_on_fail', False)
+            window_size = self.config.get('window_size')
 
             # Create tracker
             tracker = self._create_tracker(tracker_type)
             if tracker is None:
                 return self._error(f"Could not create tracker: {tracker_type}")
 
-            # Initialize tracker on first frame
-            x, y, w, h = init_bbox
-            bbox = (x, y, w, h)
+            if window_size and len(frames) > window_size + 1:
+                track = self._track_windowed(tracker, frames, init_bbox, tracker_type,
+                                             reinit_on_fail, window_size)
+            else:
+                track = self._track_window(tracker, frames, init_bbox, reinit_on_fail)
+                if track is not None:
+                    track = track + (1, 0)
 
-            success = tracker.init(frames[0], bbox)
-            if not success:
+            if track is None:
                 return self._error("Failed to initialize tracker")
+            tracked_boxes, tracking_success, confidence_scores, n_windows, n_retracked = track
 
-            # Track through frames
-            tracked_boxes = [init_bbox]
-            tracking_success = [True]
-            confidence_scores = [1.0]
-
-            for frame_idx in range(1, len(frames)):
-                frame = frames[frame_idx]
-                success, bbox = tracker.update(frame)
-
-                if success:
-                    x, y, w, h = bbox
-                    x = max(0, int(x))
-                    y = max(0, int(y))
-                    w = max(1, int(w))
-                    h = max(1, int(h))
-
-                    if x + w > frame.shape[1]:
-                        w = frame.shape[1] - x
-                    if y + h > frame.shape[0]:
-                        h = frame.shape[0] - y
-
-                    tracked_boxes.append([x, y, w, h])
-                    tracking_success.append(True)
-
-                    if len(tracked_boxes) > 1:
-                        prev_area = tracked_boxes[-2][2] * tracked_boxes[-2][3]
-                        curr_area = w * h
-                        area_ratio = min(curr_area, prev_area) / max(curr_area, prev_area)
-                        confidence = area_ratio
-                    else:
-                        confidence = 1.0
-
-                    confidence_scores.append(confidence)
-                else:
-                    if reinit_on_fail and len(tracked_boxes) > 0:
-                        tracked_boxes.append(tracked_boxes[-1])
-                        tracking_success.append(False)
-                        confidence_scores.append(0.0)
-                    else:
-                        tracked_boxes.append(tracked_boxes[-1] if tracked_boxes else init_bbox)
-                        tracking_success.append(False)
-                        confidence_scores.append(0.0)
-
-            success_rate = sum(tracking_success) / len(tracking_success)
+            success_rate = float(tracking_success.mean())
 
             return BlockOutput(
                 block_id=self.block_id,
                 status=BlockStatus.COMPLETED,
                 data={
-                    'tracked_boxes': tracked_boxes,
-                    'tracking_success': tracking_success,
-                    'confidence_scores': confidence_scores,
+                    'tracked_boxes': tracked_boxes.tolist(),
+                    'tracking_success': tracking_success.tolist(),
+                    'confidence_scores': confidence_scores.tolist(),
                     'frames': frames
                 },
                 metrics={
                     'tracker_type': tracker_type,
                     'n_frames': len(frames),
                     'success_rate': success_rate,
-                    'avg_confidence': float(np.mean(confidence_scores)),
-                    'n_failures': len(tracking_success) - sum(tracking_success)
+                    'avg_confidence': float(confidence_scores.mean()),
+                    'n_failures': int(len(tracking_success) - np.count_nonzero(tracking_success)),
+                    'n_windows': n_windows,
+                    'n_retracked_windows': n_retracked
                 }
             )
 
@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration for the Mammoth backend
+
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+Serving uses many single-threaded sync workers. Inference for tree models
+takes well under a millisecond, so request overhead dominates and the way
+to scale predict throughput is more processes, not more threads per call.
+Setting MAMMOTH_THREADS > 1 switches to threaded workers and turns on
+request coalescing for tree-model predictions (MAMMOTH_BATCH_PREDICTIONS),
+which only helps when a worker has several requests in flight.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('MAMMOTH_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('MAMMOTH_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('MAMMOTH_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+batch_predictions = os.environ.get('MAMMOTH_BATCH_PREDICTIONS', '1' if threads > 1 else '0')
+
+# Model training can take a while on larger datasets
+timeout = 300
+
+# Each worker is one process; keep BLAS/OpenMP from spawning a full thread
+# pool per worker, which would oversubscribe the cores
+raw_env = [
+    f"OMP_NUM_THREADS={os.environ.get('OMP_NUM_THREADS', '1')}",
+    f"MAMMOTH_BATCH_PREDICTIONS={batch_predictions}",
+    # Workers already fill the cores; /api/models/compare trains serially in each
+    f"MAMMOTH_COMPARE_WORKERS={os.environ.get('MAMMOTH_COMPARE_WORKERS', '1')}"
+]
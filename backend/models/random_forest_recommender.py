@@ -11,6 +11,8 @@ from typing import Dict, List, Optional, Tuple
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 
+from utils.ranking import top_k_rows
+
 
 class RandomForestRecommender:
     """
@@ -94,19 +96,20 @@ class RandomForestRecommender:
         user_encoded = self.user_encoder.transform(data['user_id'])
         item_encoded = self.item_encoder.transform(data['item_id'])
 
-        # Create feature matrix
-        X = np.column_stack([user_encoded, item_encoded])
-
         # Add additional features if available
         feature_cols = [col for col in data.columns
                        if col not in ['user_id', 'item_id', 'rating', 'timestamp']]
 
+        # Create feature matrix as one C-contiguous float32 block; the trees
+        # work in float32, so fit/predict use it without converting
+        X = np.empty((len(data), 2 + len(feature_cols)), dtype=np.float32)
+        X[:, 0] = user_encoded
+        X[:, 1] = item_encoded
         if feature_cols:
-            additional_features = data[feature_cols].values
-            X = np.column_stack([X, additional_features])
+            X[:, 2:] = data[feature_cols].to_numpy(dtype=np.float32)
 
         # Extract target if available
-        y = data['rating'].values if 'rating' in data.columns else None
+        y = data['rating'].to_numpy() if 'rating' in data.columns else None
 
         return X, y
 
@@ -186,21 +189,24 @@ class RandomForestRecommender:
             item_pool = self.item_encoder.classes_.tolist()
 
         recommendations = {}
-
-        for user_id in user_ids:
-            # Create candidate user-item pairs
-            candidates = pd.DataFrame({
-                'user_id': [user_id] * len(item_pool),
-                'item_id': item_pool
-            })
-
-            # Predict scores
-            scores = self.predict_ratings(candidates)
-
-            # Get top-K items
-            top_indices = np.argsort(scores)[::-1][:top_k]
-            top_items = [(item_pool[idx], float(scores[idx]))
-                        for idx in top_indices]
+        user_ids = list(user_ids)
+        n_items = len(item_pool)
+
+        # Encode users and items once and score every (user, item) pair in a
+        # single forest call instead of building a DataFrame per user
+        user_encoded = self.user_encoder.transform(user_ids)
+        item_encoded = self.item_encoder.transform(item_pool)
+        X = np.empty((len(user_ids) * n_items, 2), dtype=np.float32)
+        X[:, 0] = np.repeat(user_encoded, n_items)
+        X[:, 1] = np.tile(item_encoded, len(user_ids))
+        all_scores = self.model.predict(X).reshape(len(user_ids), n_items)
+
+        # Get top-K items for every user at once
+        all_top_indices, all_top_scores = top_k_rows(all_scores, top_k)
+
+        for user_id, top_indices, top_scores in zip(user_ids, all_top_indices, all_top_scores):
+            top_items = [(item_pool[idx], float(score))
+                        for idx, score in zip(top_indices, top_scores)]
 
             recommendations[user_id] = top_items
 
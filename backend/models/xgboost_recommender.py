@@ -11,6 +11,8 @@ from typing import Dict, List, Optional, Tuple
 import xgboost as xgb
 from sklearn.preprocessing import LabelEncoder
 
+from utils.ranking import top_k_indices
+
 
 class XGBoostRecommender:
     """
@@ -84,20 +86,20 @@ class XGBoostRecommender:
         user_encoded = self.user_encoder.transform(data['user_id'])
         item_encoded = self.item_encoder.transform(data['item_id'])
 
-        # Create feature matrix
-        # Basic features: user_id, item_id
-        X = np.column_stack([user_encoded, item_encoded])
-
         # Add additional features if available
         feature_cols = [col for col in data.columns
                        if col not in ['user_id', 'item_id', 'rating', 'timestamp']]
 
+        # Create feature matrix as one C-contiguous float32 block; the trees
+        # work in float32, so fit/predict use it without converting
+        X = np.empty((len(data), 2 + len(feature_cols)), dtype=np.float32)
+        X[:, 0] = user_encoded
+        X[:, 1] = item_encoded
         if feature_cols:
-            additional_features = data[feature_cols].values
-            X = np.column_stack([X, additional_features])
+            X[:, 2:] = data[feature_cols].to_numpy(dtype=np.float32)
 
         # Extract target if available
-        y = data['rating'].values if 'rating' in data.columns else None
+        y = data['rating'].to_numpy(dtype=np.float32) if 'rating' in data.columns else None
 
         return X, y
 
@@ -195,19 +197,20 @@ class XGBoostRecommender:
             item_pool = self.item_encoder.classes_.tolist()
 
         recommendations = {}
+        user_ids = list(user_ids)
+        n_items = len(item_pool)
 
-        for user_id in user_ids:
-            # Create candidate user-item pairs
-            candidates = pd.DataFrame({
-                'user_id': [user_id] * len(item_pool),
-                'item_id': item_pool
-            })
+        # Score every (user, item) candidate with a single DMatrix
+        candidates = pd.DataFrame({
+            'user_id': np.repeat(user_ids, n_items),
+            'item_id': np.tile(item_pool, len(user_ids))
+        })
+        all_scores = self.predict_ratings(candidates).reshape(len(user_ids), n_items)
 
-            # Predict scores
-            scores = self.predict_ratings(candidates)
+        # Get top-K items for every user at once
+        all_top_indices = top_k_indices(all_scores, top_k)
 
-            # Get top-K items
-            top_indices = np.argsort(scores)[::-1][:top_k]
+        for user_id, scores, top_indices in zip(user_ids, all_scores, all_top_indices):
             top_items = [(item_pool[idx], float(scores[idx]))
                         for idx in top_indices]
 
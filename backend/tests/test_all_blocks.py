@@ -9,6 +9,8 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from blocks import *
+from blocks.xgboost_block import XGBOOST_AVAILABLE
+import numpy as np
 import unittest
 
 
@@ -43,6 +45,56 @@ class TestDataSourceBlock(unittest.TestCase):
         output = block.execute({})
         self.assertEqual(len(output.data['dataframe']), 100)
 
+    def test_csv_with_string_and_large_ids(self):
+        import tempfile
+        import pandas as pd
+        rows = pd.DataFrame({
+            'user_id': ['u1', 'u2', 'u3', 'u1'],
+            'item_id': [2**40, 5, 2**40 + 1, 7],
+            'rating': [4.0, 3.5, 5.0, 1.0]
+        })
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'ratings.csv')
+            rows.to_csv(path, index=False)
+
+            for sample_size in (0, 3):
+                block = DataSourceBlock('test-datasrc-csv')
+                block.configure(data_source='csv', file_path=path, sample_size=sample_size)
+                output = block.execute({})
+                self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+
+                df = output.data['dataframe']
+                self.assertTrue(set(df['user_id']) <= {'u1', 'u2', 'u3'})
+                self.assertTrue(set(df['item_id']) <= {2**40, 5, 2**40 + 1, 7})
+                self.assertEqual(df['item_id'].dtype, np.int64)
+
+    def test_csv_sample_keeps_only_sample_size_rows(self):
+        import tempfile
+        import pandas as pd
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'ratings.csv')
+            pd.DataFrame({
+                'user_id': np.arange(20000),
+                'item_id': np.arange(20000) % 50,
+                'rating': 3.0
+            }).to_csv(path, index=False)
+
+            # The sampling state is the kept rows only, not one entry per skipped row
+            keep = DataSourceBlock._sample_keep_rows(path, 10)
+            self.assertEqual(len(keep), 10)
+            self.assertTrue(all(1 <= row <= 20000 for row in keep))
+
+            block = DataSourceBlock('test-datasrc-csv-sample')
+            block.configure(data_source='csv', file_path=path, sample_size=10)
+            df = block.execute({}).data['dataframe']
+            self.assertEqual(sorted(df['user_id']), sorted(row - 1 for row in keep))
+
+            # A last line without a trailing newline is still a data row
+            with open(path, 'w') as f:
+                f.write('user_id,item_id,rating\n1,2,3.0\n4,5,1.0')
+            self.assertIsNone(DataSourceBlock._sample_keep_rows(path, 2))
+            self.assertLessEqual(DataSourceBlock._sample_keep_rows(path, 1), {1, 2})
+
 
 class TestSplitBlock(unittest.TestCase):
     """Test Split Block"""
@@ -104,6 +156,52 @@ class TestCollaborativeFilteringBlock(unittest.TestCase):
         self.assertEqual(output.status, BlockStatus.COMPLETED)
         self.assertIn('model', output.data)
 
+    def test_k_neighbors_limits_similarity(self):
+        data_block = DataSourceBlock('data')
+        data_block.configure(data_source='synthetic', n_users=20, n_items=30, n_interactions=200)
+        data_output = data_block.execute({})
+
+        cf_block = CollaborativeFilteringBlock('cf')
+        cf_block.configure(method='user-based', k_neighbors=5)
+
+        output = cf_block.execute({'processed-data': data_output.data['dataframe']})
+        self.assertEqual(output.status, BlockStatus.COMPLETED)
+
+        row_nnz = np.diff(cf_block.similarity_matrix.indptr)
+        self.assertLessEqual(row_nnz.max(), 5)
+
+    def test_quantize_ratings_keeps_off_grid_ratings(self):
+        import pandas as pd
+        rng = np.random.default_rng(0)
+        for ratings in (rng.uniform(-10, 10, 300), np.r_[0.12, -0.6, 80.0, rng.normal(size=297)]):
+            data = pd.DataFrame({
+                'user_id': rng.integers(0, 20, 300),
+                'item_id': rng.integers(0, 30, 300),
+                'rating': ratings
+            })
+            vectors = {}
+            for quantize in (True, False):
+                cf_block = CollaborativeFilteringBlock('cf')
+                cf_block.configure(method='user-based', quantize_ratings=quantize)
+                matrix = cf_block._create_matrix(data)
+                vectors[quantize] = cf_block._similarity_vectors(matrix, 'user-based').toarray()
+            np.testing.assert_allclose(vectors[True], vectors[False], rtol=1e-6)
+
+    def test_quantize_ratings_on_half_star_grid(self):
+        import pandas as pd
+        rng = np.random.default_rng(1)
+        data = pd.DataFrame({
+            'user_id': rng.integers(0, 20, 300),
+            'item_id': rng.integers(0, 30, 300),
+            'rating': rng.integers(1, 11, 300) / 2
+        })
+        cf_block = CollaborativeFilteringBlock('cf')
+        cf_block.configure(method='user-based', quantize_ratings=True)
+        matrix = cf_block._create_matrix(data)
+        expected = matrix.toarray() / np.linalg.norm(matrix.toarray(), axis=1, keepdims=True)
+        np.testing.assert_allclose(cf_block._similarity_vectors(matrix, 'user-based').toarray(),
+                                   expected, rtol=1e-6)
+
 
 class TestMatrixFactorizationBlock(unittest.TestCase):
     """Test Matrix Factorization Block"""
@@ -124,6 +222,116 @@ class TestMatrixFactorizationBlock(unittest.TestCase):
         self.assertEqual(output.status, BlockStatus.COMPLETED)
         self.assertIn('model', output.data)
 
+    def test_eig_svd_matches_svd(self):
+        from scipy import sparse
+        from blocks.matrix_factorization import eig_svd_factors
+
+        # Rank-4 signal plus noise, so the top singular values are well separated
+        rng = np.random.default_rng(0)
+        dense = rng.normal(size=(60, 4)) @ rng.normal(size=(4, 40)) * 3 + rng.normal(size=(60, 40))
+        matrix = sparse.csr_matrix(dense)
+        # n_factors <= min(shape) / 10, so _factorize takes the eig path too
+        n_factors = 4
+
+        sigma = np.linalg.svd(dense, compute_uv=False)
+        best_error = np.sqrt((sigma[n_factors:] ** 2).sum())
+
+        for name, factorize in (
+            ('eig_svd_factors', eig_svd_factors),
+            ('_factorize', MatrixFactorizationBlock._factorize),
+        ):
+            with self.subTest(path=name):
+                user_factors, item_factors = factorize(matrix, n_factors)
+                # Columns of U * sigma have norm sigma
+                np.testing.assert_allclose(
+                    np.sort(np.linalg.norm(user_factors, axis=0))[::-1], sigma[:n_factors], rtol=1e-4
+                )
+                np.testing.assert_allclose(item_factors.T @ item_factors, np.eye(n_factors), atol=1e-4)
+                error = np.linalg.norm(dense - user_factors @ item_factors.T)
+                self.assertAlmostEqual(error / best_error, 1.0, places=4)
+
+
+@unittest.skipUnless(XGBOOST_AVAILABLE, "xgboost not installed")
+class TestXGBoostBlock(unittest.TestCase):
+    """Test XGBoost Block"""
+
+    def _train_data(self):
+        data_block = DataSourceBlock('data')
+        data_block.configure(data_source='synthetic', n_users=20, n_items=30, n_interactions=300)
+        return data_block.execute({}).data['dataframe']
+
+    def test_device_falls_back_to_cpu(self):
+        from blocks import xgboost_block
+        train_data = self._train_data()
+
+        for device in ('cpu', 'CPU', 'cuda', 'cuda:0', 'GPU', 'tpu'):
+            block = XGBoostBlock('xgb')
+            block.configure(n_estimators=5, device=device)
+            output = block.execute({'processed-data': train_data})
+            self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+            if not xgboost_block.CUDA_AVAILABLE:
+                self.assertEqual(output.metrics['device'], 'cpu')
+
+    def _all_pairs_predict(self, block):
+        n_users, n_items = len(block.user_ids), len(block.item_ids)
+        features = block._create_batch_features(
+            np.repeat(np.arange(n_users), n_items), np.tile(np.arange(n_items), n_users)
+        )
+        return features, block.model.get_booster().inplace_predict(features).reshape(n_users, n_items)
+
+    def test_separable_trees_match_model_predict(self):
+        block = XGBoostBlock('xgb')
+        block.configure(n_estimators=30, separable_trees=True)
+        output = block.execute({'processed-data': self._train_data()})
+        self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+
+        separable = block._separable_predictions()
+        self.assertIsNotNone(separable)
+        _, expected = self._all_pairs_predict(block)
+        np.testing.assert_allclose(separable, expected, atol=1e-4)
+        np.testing.assert_allclose(output.data['model']['predictions'], expected, atol=1e-4)
+
+    def test_tree_ranges_sum_to_full_prediction(self):
+        from unittest import mock
+        from blocks import xgboost_block
+        block = XGBoostBlock('xgb')
+        block.configure(n_estimators=20)
+        output = block.execute({'processed-data': self._train_data()})
+        self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+
+        features, expected = self._all_pairs_predict(block)
+        booster = block.model.get_booster()
+        # Ranges (0, 6), (6, 12), (12, 18), (18, 20); the base score (near the
+        # mean rating) must be added by the first range only
+        with mock.patch.object(xgboost_block, 'PREDICT_TREE_CHUNK', 6):
+            ranged = XGBoostBlock._predict_in_tree_ranges(booster, features)
+        np.testing.assert_allclose(ranged.reshape(expected.shape), expected, atol=1e-4)
+
+
+class TestRandomForestBlock(unittest.TestCase):
+    """Test Random Forest Block"""
+
+    def _train_data(self):
+        data_block = DataSourceBlock('data')
+        data_block.configure(data_source='synthetic', n_users=20, n_items=30, n_interactions=300)
+        return data_block.execute({}).data['dataframe']
+
+    def test_stats_features_by_default(self):
+        block = RandomForestBlock('rf')
+        block.configure(n_estimators=5)
+        output = block.execute({'processed-data': self._train_data()})
+        self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+        self.assertEqual(output.metrics['n_features'], 9)
+        self.assertIsNotNone(output.data['model']['feature_stats'])
+
+    def test_index_features_only(self):
+        block = RandomForestBlock('rf')
+        block.configure(n_estimators=5, use_stats_features_at_predict=False)
+        output = block.execute({'processed-data': self._train_data()})
+        self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+        self.assertEqual(output.metrics['n_features'], 2)
+        self.assertIsNone(output.data['model']['feature_stats'])
+
 
 class TestPredictionsBlock(unittest.TestCase):
     """Test Predictions Block"""
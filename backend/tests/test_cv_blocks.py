@@ -0,0 +1,120 @@
+"""
+Tests for the computer vision blocks
+"""
+
+import sys
+import unittest
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import cv2
+import numpy as np
+
+from backend.blocks.base import BlockStatus
+from backend.cv_blocks.template_matcher import FFTTemplateMatcher
+from backend.cv_blocks.tracker import TrackerBlock
+
+MATCH_METHODS = {
+    'TM_SQDIFF': cv2.TM_SQDIFF,
+    'TM_SQDIFF_NORMED': cv2.TM_SQDIFF_NORMED,
+    'TM_CCORR': cv2.TM_CCORR,
+    'TM_CCORR_NORMED': cv2.TM_CCORR_NORMED,
+    'TM_CCOEFF': cv2.TM_CCOEFF,
+    'TM_CCOEFF_NORMED': cv2.TM_CCOEFF_NORMED,
+}
+
+
+class TestFFTTemplateMatcher(unittest.TestCase):
+    """FFTTemplateMatcher against cv2.matchTemplate"""
+
+    def _frame_and_template(self, channels):
+        rng = np.random.default_rng(0)
+        shape = (90, 120) if channels == 1 else (90, 120, channels)
+        frame = rng.integers(0, 256, shape, dtype=np.uint8)
+        template = frame[31:55, 47:75].copy()
+        return frame, template
+
+    def _check(self, frame, template):
+        for name, method in MATCH_METHODS.items():
+            with self.subTest(method=name, channels=frame.ndim):
+                expected = cv2.matchTemplate(frame, template, method)
+                result = FFTTemplateMatcher(frame.shape, template, method).match(frame)
+
+                self.assertEqual(result.shape, expected.shape)
+                scale = max(1.0, float(np.abs(expected).max()))
+                np.testing.assert_allclose(result / scale, expected / scale, atol=1e-4)
+
+                # Best location: the minimum for the SQDIFF methods, the maximum otherwise
+                loc = 2 if method in (cv2.TM_SQDIFF, cv2.TM_SQDIFF_NORMED) else 3
+                self.assertEqual(cv2.minMaxLoc(result)[loc], cv2.minMaxLoc(expected)[loc])
+
+    def test_grayscale_matches_opencv(self):
+        self._check(*self._frame_and_template(1))
+
+    def test_color_matches_opencv(self):
+        self._check(*self._frame_and_template(3))
+
+    def test_set_template_matches_opencv(self):
+        frame, template = self._frame_and_template(3)
+        other = frame[10:30, 5:29].copy()
+        for name, method in MATCH_METHODS.items():
+            with self.subTest(method=name):
+                matcher = FFTTemplateMatcher(frame.shape, template, method)
+                matcher.set_template(other)
+                expected = cv2.matchTemplate(frame, other, method)
+                scale = max(1.0, float(np.abs(expected).max()))
+                np.testing.assert_allclose(matcher.match(frame) / scale, expected / scale, atol=1e-4)
+
+
+
+class TestTrackerBlock(unittest.TestCase):
+    """Windowed tracking against a single sequential pass"""
+
+    def _moving_square(self, n_frames):
+        """Textured square moving (2, 1) px per frame over a noisy background"""
+        rng = np.random.default_rng(0)
+        background = rng.integers(0, 60, (120, 160, 3), dtype=np.uint8)
+        square = rng.integers(120, 256, (24, 24, 3), dtype=np.uint8)
+        frames, truth = [], []
+        for t in range(n_frames):
+            x, y = 10 + 2 * t, 20 + t
+            frame = background.copy()
+            frame[y:y + 24, x:x + 24] = square
+            frames.append(frame)
+            truth.append([x, y, 24, 24])
+        return frames, np.array(truth)
+
+    def _track(self, frames, init_bbox, **config):
+        block = TrackerBlock('tracker')
+        block.configure(tracker_type='csrt', **config)
+        output = block.execute({'frames': frames, 'init_bbox': init_bbox})
+        self.assertEqual(output.status, BlockStatus.COMPLETED, output.errors)
+        return output
+
+    def test_windowed_matches_sequential(self):
+        frames, truth = self._moving_square(40)
+        for skip in (1, 3):
+            with self.subTest(skip_frames=skip):
+                sequential = self._track(frames, truth[0].tolist(), skip_frames=skip)
+                windowed = self._track(frames, truth[0].tolist(), skip_frames=skip, window_size=9)
+                self.assertEqual(windowed.metrics['n_windows'], 5)
+
+                boxes = np.array(windowed.data['tracked_boxes'])
+                self.assertLessEqual(np.abs(boxes - np.array(sequential.data['tracked_boxes'])).max(), 3)
+                self.assertLessEqual(np.abs(boxes - truth).max(), 3)
+
+    def test_windowed_keeps_frame_count(self):
+        # Lengths that end on, just after and well past a window boundary
+        for n_frames in (19, 20, 23):
+            frames, truth = self._moving_square(n_frames)
+            for skip in (1, 2, 3):
+                with self.subTest(n_frames=n_frames, skip_frames=skip):
+                    output = self._track(frames, truth[0].tolist(), skip_frames=skip, window_size=6)
+                    self.assertGreater(output.metrics['n_windows'], 1)
+                    self.assertEqual(output.metrics['n_frames'], n_frames)
+                    for key in ('tracked_boxes', 'tracking_success', 'confidence_scores'):
+                        self.assertEqual(len(output.data[key]), n_frames)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,88 @@
+"""
+Tests for the batched ranking metrics against the scalar *_at_k functions
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+from utils.metrics import RecommenderMetrics
+
+
+class TestBatchedRankingScores(unittest.TestCase):
+    """_batched_ranking_scores and its kernel reproduce the scalar metrics"""
+
+    METRICS = ('precision', 'recall', 'ndcg', 'map', 'hit_rate')
+
+    def setUp(self):
+        self.recommender_metrics = RecommenderMetrics()
+        self.scalar_fns = {
+            'precision': RecommenderMetrics.precision_at_k,
+            'recall': RecommenderMetrics.recall_at_k,
+            'ndcg': RecommenderMetrics.ndcg_at_k,
+            'map': RecommenderMetrics.map_at_k,
+            'hit_rate': RecommenderMetrics.hit_rate_at_k
+        }
+
+    def _cases(self):
+        """Relevant and ranked item lists per user: int and string ids, some lists shorter than k"""
+        rng = np.random.default_rng(0)
+        relevant_lists, top_lists = [], []
+        for _ in range(200):
+            relevant_lists.append(rng.integers(0, 30, rng.integers(1, 12)).tolist())
+            top_lists.append(rng.permutation(30)[:rng.integers(0, 11)].tolist())
+        yield relevant_lists, top_lists
+        yield ([[f"item{i}" for i in items] for items in relevant_lists],
+               [[f"item{i}" for i in items] for items in top_lists])
+
+    def _kernels(self):
+        """The kernel as imported (compiled when Numba is installed) and its pure-Python form"""
+        kernel = metrics._ranking_scores_kernel
+        yield 'default', kernel
+        yield 'python', getattr(kernel, 'py_func', kernel)
+
+    def test_batched_scores_match_scalar(self):
+        for kernel_name, kernel in self._kernels():
+            for relevant_lists, top_lists in self._cases():
+                for metric in self.METRICS:
+                    for k in (1, 5, 10):
+                        with self.subTest(kernel=kernel_name, metric=metric, k=k,
+                                          id_type=type(relevant_lists[0][0]).__name__):
+                            expected = [self.scalar_fns[metric](relevant, top[:k], k)
+                                        for relevant, top in zip(relevant_lists, top_lists)]
+                            with mock.patch.object(metrics, '_ranking_scores_kernel', kernel):
+                                scores = RecommenderMetrics._batched_ranking_scores(
+                                    relevant_lists, [top[:k] for top in top_lists], metric, k
+                                )
+                            np.testing.assert_allclose(scores, expected, rtol=1e-12, atol=1e-12)
+
+    def test_calculate_ranking_metric_paths_agree(self):
+        relevant_lists, top_lists = next(self._cases())
+        test_data = pd.DataFrame({
+            'user_id': np.repeat(np.arange(len(relevant_lists)), [len(r) for r in relevant_lists]),
+            'item_id': [item for items in relevant_lists for item in items],
+            'rating': 4.0
+        })
+        # Every other user has recommendations; the rest are skipped by both paths
+        topk = {user_id: top for user_id, top in enumerate(top_lists) if user_id % 2 == 0}
+
+        for metric in self.METRICS:
+            for k in (1, 5, 10):
+                with self.subTest(metric=metric, k=k):
+                    scores = {}
+                    for numba_available in (True, False):
+                        with mock.patch.object(metrics, 'NUMBA_AVAILABLE', numba_available):
+                            scores[numba_available] = self.recommender_metrics.calculate_ranking_metric(
+                                test_data, None, metric, k, precomputed_topk=topk
+                            )
+                    self.assertAlmostEqual(scores[True], scores[False], places=12)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+"""
+Tests for the disk-backed pipeline store used by the API
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from utils.pipeline_store import PipelineStore
+
+
+class TestPipelineStoreLifetime(unittest.TestCase):
+    """In-memory eviction, reload from disk and TTL expiry"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self._tmp.name)
+        self.store = PipelineStore(self.cache_dir, max_in_memory=1, ttl=1)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _age(self, pipeline_id, seconds=10):
+        """Back-date a pipeline's last access past the TTL"""
+        past = time.time() - seconds
+        os.utime(self.cache_dir / f"{pipeline_id}.joblib", (past, past))
+
+    def test_evicted_pipeline_reloads_from_disk(self):
+        self.store['a'] = {'train': np.arange(5)}
+        self.store['b'] = {'train': np.arange(3)}
+        self.assertEqual(list(self.store._hot), ['b'])
+
+        np.testing.assert_array_equal(self.store['a']['train'], np.arange(5))
+        self.assertEqual(list(self.store._hot), ['a'])
+        self.assertEqual(len(self.store), 2)
+
+    def test_idle_pipeline_expires(self):
+        self.store['a'] = {'train': np.arange(5)}
+        self.store['b'] = {'train': np.arange(3)}
+        self._age('a')
+
+        self.assertNotIn('a', self.store)
+        self.assertIn('b', self.store)
+        with self.assertRaises(KeyError):
+            self.store['a']
+        self.assertFalse((self.cache_dir / 'a.joblib').exists())
+        self.assertFalse((self.cache_dir / 'a.version').exists())
+        self.assertNotIn('a', self.store._hot)
+
+    def test_expired_marker(self):
+        self.store['a'] = {'train': np.arange(5)}
+        self._age('a')
+        # Any save sweeps idle pipelines, even ones this worker never reads again
+        self.store['b'] = {'train': np.arange(3)}
+
+        self.assertTrue((self.cache_dir / 'a.expired').exists())
+        self.assertTrue(self.store.is_expired('a'))
+        self.assertFalse(self.store.is_expired('b'))
+        self.assertFalse(self.store.is_expired('never-created'))
+
+    def test_api_reports_expired_pipeline(self):
+        import app as app_module
+        self.store['a'] = {'train': np.arange(5)}
+        self._age('a')
+
+        with mock.patch.object(app_module, 'active_pipelines', self.store):
+            client = app_module.app.test_client()
+            for response in (client.get('/api/pipeline/info/a'),
+                             client.post('/api/models/train', json={'pipeline_id': 'a', 'model_type': 'xgboost'})):
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.get_json()['error'], 'Pipeline expired, reload the data')
+
+            response = client.get('/api/pipeline/info/never-created')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.get_json()['error'], 'Invalid pipeline_id')
+
+
+class TestPipelineStoreWorkers(unittest.TestCase):
+    """Two stores on one cache_dir behave like two gunicorn workers"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_reads_see_other_workers_saves(self):
+        worker_a = PipelineStore(self.cache_dir)
+        worker_b = PipelineStore(self.cache_dir)
+
+        worker_a['p'] = {'train': [1, 2, 3]}
+        self.assertNotIn('model', worker_b['p'])
+
+        worker_a.update('p', model='trained')
+        self.assertEqual(worker_b['p']['model'], 'trained')
+
+    def test_update_keeps_other_workers_fields(self):
+        worker_a = PipelineStore(self.cache_dir)
+        worker_b = PipelineStore(self.cache_dir)
+
+        worker_a['p'] = {'train': [1, 2, 3]}
+        worker_b['p']  # B now holds a copy without a model
+
+        worker_a.update('p', model='trained')
+        worker_b.update('p', evaluation={'rmse': 1.0})
+
+        for worker in (worker_a, worker_b, PipelineStore(self.cache_dir)):
+            self.assertEqual(worker['p']['model'], 'trained')
+            self.assertEqual(worker['p']['evaluation'], {'rmse': 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
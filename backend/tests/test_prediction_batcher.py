@@ -0,0 +1,53 @@
+"""
+Tests for request coalescing of top-K predictions
+"""
+
+import sys
+import threading
+import unittest
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.prediction_batcher import PredictionBatcher
+
+
+class _FakeModel:
+    """Recommends item 0 for every user except 'unknown', which it drops"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, user_ids, top_k=10):
+        self.calls.append(list(user_ids))
+        return {user_id: [(0, 1.0)] for user_id in user_ids if user_id != 'unknown'}
+
+
+class TestPredictionBatcher(unittest.TestCase):
+
+    def test_missing_user_fails_only_its_request(self):
+        batcher = PredictionBatcher(max_wait=0.05)
+        model = _FakeModel()
+        results = {}
+
+        def request(name, user_ids):
+            try:
+                results[name] = batcher.predict(model, user_ids, top_k=1)
+            except Exception as e:
+                results[name] = e
+
+        threads = [threading.Thread(target=request, args=('bad', ['unknown']), daemon=True),
+                   threading.Thread(target=request, args=('good', [1, 2]), daemon=True)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertIsInstance(results['bad'], KeyError)
+        self.assertEqual(results['good'], {1: [(0, 1.0)], 2: [(0, 1.0)]})
+
+        # The worker thread survived and keeps serving
+        self.assertEqual(batcher.predict(model, [3], top_k=1), {3: [(0, 1.0)]})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,29 @@
+"""
+In-Process LRU Cache Helpers
+
+Blocks memoize expensive intermediates (interaction matrices, similarities,
+factors) in module-level OrderedDicts keyed by a fingerprint of the
+training data; these helpers give them least-recently-used eviction.
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Entries kept per cache
+CACHE_SIZE = 8
+
+
+def cache_get(cache: OrderedDict, key: Hashable) -> Optional[Any]:
+    """Cached value for key (marking it most recently used), or None"""
+    if key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+
+def cache_put(cache: OrderedDict, key: Hashable, value: Any, max_size: int = CACHE_SIZE) -> None:
+    """Store value under key, evicting the least recently used entries beyond max_size"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
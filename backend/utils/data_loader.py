@@ -129,15 +129,13 @@ class DataLoader:
         --------
         train_data, test_data : tuple of DataFrames
         """
-        np.random.seed(random_state)
-
-        # Shuffle data
-        data = data.sample(frac=1, random_state=random_state).reset_index(drop=True)
+        # Shuffle row positions rather than the frame, so rows are copied once
+        order = np.random.default_rng(random_state).permutation(len(data))
 
         # Split
         split_idx = int(len(data) * (1 - test_size))
-        train_data = data.iloc[:split_idx].copy()
-        test_data = data.iloc[split_idx:].copy()
+        train_data = data.iloc[order[:split_idx]].reset_index(drop=True)
+        test_data = data.iloc[order[split_idx:]].reset_index(drop=True)
 
         return train_data, test_data
 
@@ -163,13 +161,13 @@ class DataLoader:
         if 'timestamp' not in data.columns:
             raise ValueError("Data must contain 'timestamp' column for temporal split")
 
-        # Sort by timestamp
-        data = data.sort_values('timestamp').reset_index(drop=True)
+        # Order row positions by timestamp instead of sorting the frame
+        order = np.argsort(data['timestamp'].to_numpy(), kind='stable')
 
         # Split
         split_idx = int(len(data) * (1 - test_size))
-        train_data = data.iloc[:split_idx].copy()
-        test_data = data.iloc[split_idx:].copy()
+        train_data = data.iloc[order[:split_idx]].reset_index(drop=True)
+        test_data = data.iloc[order[split_idx:]].reset_index(drop=True)
 
         return train_data, test_data
 
@@ -190,25 +188,20 @@ class DataLoader:
         user_ids : array of unique user IDs
         item_ids : array of unique item IDs
         """
-        from scipy.sparse import csr_matrix
-
-        user_ids = data['user_id'].unique()
-        item_ids = data['item_id'].unique()
-
-        # Create mapping dictionaries
-        user_to_idx = {uid: idx for idx, uid in enumerate(user_ids)}
-        item_to_idx = {iid: idx for idx, iid in enumerate(item_ids)}
+        from scipy.sparse import coo_matrix
 
-        # Map to indices
-        row_indices = data['user_id'].map(user_to_idx).values
-        col_indices = data['item_id'].map(item_to_idx).values
-        ratings = data['rating'].values
+        # factorize keeps first-appearance order, matching unique()
+        row_indices, user_ids = pd.factorize(data['user_id'].to_numpy())
+        col_indices, item_ids = pd.factorize(data['item_id'].to_numpy())
+        ratings = data['rating'].to_numpy()
 
-        # Create sparse matrix
-        matrix = csr_matrix(
-            (ratings, (row_indices, col_indices)),
+        # Create sparse matrix via COO so duplicates are summed once up front
+        coo = coo_matrix(
+            (ratings, (row_indices.astype(np.int32), col_indices.astype(np.int32))),
             shape=(len(user_ids), len(item_ids))
         )
+        coo.sum_duplicates()
+        matrix = coo.tocsr()
 
         return matrix, user_ids, item_ids
 
@@ -98,13 +98,16 @@ class KaggleDatasetLoader:
     def load_dataset(
         self,
         dataset_key: str,
-        force_refresh: bool = False
+        force_refresh: bool = False,
+        nrows: Optional[int] = None
     ) -> Tuple[pd.DataFrame, Dict[str, Any]]:
         """Load a dataset by key
 
         Args:
             dataset_key: Key from DATASETS dict
             force_refresh: If True, re-download even if cached
+            nrows: Only return the first nrows ratings (cached reads stop
+                parsing there; downloads are still cached in full)
 
         Returns:
             Tuple of (DataFrame, metadata_dict)
@@ -121,7 +124,7 @@ class KaggleDatasetLoader:
         # Check cache
         if cache_path.exists() and not force_refresh:
             logger.info(f"Loading {dataset_key} from cache: {cache_path}")
-            df = pd.read_csv(cache_path)
+            df = pd.read_csv(cache_path, nrows=nrows)
             metadata = self._get_metadata(df, dataset_info)
             return df, metadata
 
@@ -137,6 +140,9 @@ class KaggleDatasetLoader:
         df.to_csv(cache_path, index=False)
         logger.info(f"Cached to {cache_path}")
 
+        if nrows is not None:
+            df = df.head(nrows)
+
         metadata = self._get_metadata(df, dataset_info)
         return df, metadata
 
@@ -280,13 +286,16 @@ class KaggleDatasetLoader:
         dataset_info: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Extract metadata from loaded dataset"""
+        n_users = df['user_id'].unique().size
+        n_items = df['item_id'].unique().size
+
         return {
             'name': dataset_info['name'],
             'description': dataset_info['description'],
-            'n_users': df['user_id'].nunique(),
-            'n_items': df['item_id'].nunique(),
+            'n_users': n_users,
+            'n_items': n_items,
             'n_ratings': len(df),
-            'sparsity': 1 - len(df) / (df['user_id'].nunique() * df['item_id'].nunique()),
+            'sparsity': 1 - len(df) / (n_users * n_items),
             'rating_range': (df['rating'].min(), df['rating'].max()),
             'avg_rating': df['rating'].mean(),
             'cached': True
@@ -4,9 +4,72 @@ Evaluation Metrics for Recommender Systems
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Metric codes understood by _ranking_scores_kernel
+RANKING_METRIC_CODES = {'precision': 0, 'recall': 1, 'ndcg': 2, 'map': 3, 'hit_rate': 4}
+
+
+def _ranking_scores_kernel(topk, rel_indptr, rel_indices, k, metric_code, discount):
+    """
+    Per-user ranking metric over integer-coded items
+
+    topk holds each user's ranked item codes (-1 pads short lists) and
+    rel_indptr/rel_indices hold the relevant item codes in CSR layout.
+    Mirrors the scalar RecommenderMetrics *_at_k functions exactly. Compiled
+    serially: compare already runs one process per model, and a parallel
+    threading layer is not fork-safe under its ProcessPoolExecutor.
+    """
+    n_users = topk.shape[0]
+    n_top = min(k, topk.shape[1])
+    out = np.zeros(n_users, dtype=np.float64)
+
+    for u in range(n_users):
+        start = rel_indptr[u]
+        end = rel_indptr[u + 1]
+        n_rel = end - start
+
+        hits = 0
+        dcg = 0.0
+        ap = 0.0
+        for r in range(n_top):
+            item = topk[u, r]
+            if item < 0:
+                continue
+            for j in range(start, end):
+                if rel_indices[j] == item:
+                    hits += 1
+                    dcg += discount[r]
+                    ap += hits / (r + 1)
+                    break
+
+        if metric_code == 0:
+            out[u] = hits / k
+        elif metric_code == 1:
+            out[u] = hits / n_rel if n_rel > 0 else 0.0
+        elif metric_code == 2:
+            idcg = 0.0
+            for r in range(min(k, n_rel)):
+                idcg += discount[r]
+            out[u] = dcg / idcg if idcg > 0 else 0.0
+        elif metric_code == 3:
+            out[u] = ap / min(n_rel, k) if n_rel > 0 else 0.0
+        else:
+            out[u] = 1.0 if hits > 0 else 0.0
+
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _ranking_scores_kernel = njit(cache=True)(_ranking_scores_kernel)
+
 
 class RecommenderMetrics:
     """
@@ -16,6 +79,24 @@ class RecommenderMetrics:
     ranking metrics (Precision@K, Recall@K, NDCG@K, MAP@K)
     """
 
+    # Position discounts 1 / log2(rank + 1), keyed by length
+    _NDCG_DISCOUNT_CACHE: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def ndcg_discount(cls, k: int) -> np.ndarray:
+        """
+        DCG discounts for ranks 1..k, computed once per k and reused
+
+        The cache is append-only and the assignment is atomic, so it is
+        safe to share between threads.
+        """
+        arr = cls._NDCG_DISCOUNT_CACHE.get(k)
+        if arr is None:
+            arr = 1.0 / np.log2(np.arange(2, k + 2, dtype=np.float64))
+            arr.flags.writeable = False
+            cls._NDCG_DISCOUNT_CACHE[k] = arr
+        return arr
+
     @staticmethod
     def calculate_rating_metric(
         y_true: np.ndarray,
@@ -122,13 +203,10 @@ class RecommenderMetrics:
         dcg : float
         """
         top_k = y_pred[:k]
+        relevant_set = set(y_true)
 
-        dcg = 0.0
-        for i, item in enumerate(top_k, 1):
-            if item in y_true:
-                dcg += 1.0 / np.log2(i + 1)
-
-        return dcg
+        hits = np.fromiter((item in relevant_set for item in top_k), dtype=bool, count=len(top_k))
+        return float(RecommenderMetrics.ndcg_discount(len(top_k))[hits].sum())
 
     @staticmethod
     def ndcg_at_k(
@@ -219,12 +297,83 @@ class RecommenderMetrics:
 
         return 1.0 if len(top_k & relevant_set) > 0 else 0.0
 
+    @staticmethod
+    def predict_top_k(
+        test_data: pd.DataFrame,
+        model,
+        k: int
+    ) -> Dict[Any, List[int]]:
+        """
+        Ranked top-k item IDs for every user in the test data
+
+        Runs a single batched model.predict call so several metrics and
+        cutoffs can be computed from one set of recommendations. Users the
+        model cannot score are left out.
+
+        Parameters:
+        -----------
+        test_data : DataFrame with columns [user_id, item_id, rating]
+        model : trained recommender model with predict() method
+        k : int, largest cutoff that will be evaluated
+
+        Returns:
+        --------
+        user_topk : dict mapping user ID to a ranked list of item IDs
+        """
+        user_ids = test_data['user_id'].unique().tolist()
+
+        try:
+            recommendations = model.predict(user_ids, top_k=k)
+        except Exception:
+            # Fall back to per-user calls so one unscorable user doesn't drop the rest
+            recommendations = {}
+            for user_id in user_ids:
+                try:
+                    recommendations.update(model.predict([user_id], top_k=k))
+                except Exception:
+                    continue
+
+        return {
+            user_id: [item_id for item_id, _ in recs]
+            for user_id, recs in recommendations.items()
+        }
+
+    @classmethod
+    def _batched_ranking_scores(
+        cls,
+        relevant_lists: List[List[Any]],
+        top_lists: List[List[Any]],
+        metric: str,
+        k: int
+    ) -> np.ndarray:
+        """Score every user in one compiled pass over integer-coded item ids"""
+        rel_len = np.fromiter(map(len, relevant_lists), dtype=np.int64, count=len(relevant_lists))
+        top_len = np.fromiter(map(len, top_lists), dtype=np.int64, count=len(top_lists))
+
+        # One shared code space for relevant and recommended item ids
+        flat = np.array(
+            [item for items in relevant_lists for item in items] +
+            [item for items in top_lists for item in items]
+        )
+        codes = pd.factorize(flat)[0].astype(np.int64) if len(flat) else np.empty(0, dtype=np.int64)
+        n_rel = int(rel_len.sum())
+
+        rel_indptr = np.concatenate([[0], np.cumsum(rel_len)]).astype(np.int64)
+        topk = np.full((len(top_lists), k), -1, dtype=np.int64)
+        topk[np.arange(k) < top_len[:, None]] = codes[n_rel:]
+
+        return _ranking_scores_kernel(
+            topk, rel_indptr, codes[:n_rel], k,
+            RANKING_METRIC_CODES[metric], cls.ndcg_discount(k)
+        )
+
     def calculate_ranking_metric(
         self,
         test_data: pd.DataFrame,
         model,
         metric: str,
-        k: int
+        k: int,
+        precomputed_topk: Optional[Dict[Any, List[int]]] = None
     ) -> float:
         """
         Calculate ranking metrics for a model on test data
@@ -235,44 +384,53 @@ class RecommenderMetrics:
         model : trained recommender model with predict() method
         metric : str, one of ['precision', 'recall', 'ndcg', 'map', 'hit_rate']
         k : int, cutoff for evaluation
+        precomputed_topk : optional output of predict_top_k with a cutoff >= k;
+            reused instead of calling model.predict again
 
         Returns:
         --------
         average_score : float, average metric across all users
         """
-        # Group test data by user
-        user_groups = test_data.groupby('user_id')
-
-        scores = []
-
-        for user_id, group in user_groups:
-            # Get ground truth relevant items for this user
-            relevant_items = group['item_id'].tolist()
-
+        if precomputed_topk is None:
+            precomputed_topk = self.predict_top_k(test_data, model, k)
+
+        metric_fns = {
+            'precision': self.precision_at_k,
+            'recall': self.recall_at_k,
+            'ndcg': self.ndcg_at_k,
+            'map': self.map_at_k,
+            'hit_rate': self.hit_rate_at_k
+        }
+        if metric not in metric_fns:
+            raise ValueError(f"Unknown ranking metric: {metric}")
+        metric_fn = metric_fns[metric]
+
+        # Ground truth relevant items per user
+        user_items = test_data.groupby('user_id')['item_id'].agg(list)
+
+        if NUMBA_AVAILABLE and k > 0:
+            users = [user_id for user_id in user_items.index if user_id in precomputed_topk]
+            if not users:
+                return 0.0
+            return self._batched_ranking_scores(
+                [user_items[user_id] for user_id in users],
+                [precomputed_topk[user_id][:k] for user_id in users],
+                metric,
+                k
+            ).mean()
+
+        scores = np.empty(len(user_items), dtype=np.float64)
+        n_scored = 0
+
+        for user_id, relevant_items in user_items.items():
             # Get model recommendations
-            try:
-                recommendations = model.predict([user_id], top_k=k)
-                predicted_items = [item_id for item_id, _ in recommendations[user_id]]
-            except:
+            if user_id not in precomputed_topk:
                 continue
 
-            # Calculate metric
-            if metric == 'precision':
-                score = self.precision_at_k(relevant_items, predicted_items, k)
-            elif metric == 'recall':
-                score = self.recall_at_k(relevant_items, predicted_items, k)
-            elif metric == 'ndcg':
-                score = self.ndcg_at_k(relevant_items, predicted_items, k)
-            elif metric == 'map':
-                score = self.map_at_k(relevant_items, predicted_items, k)
-            elif metric == 'hit_rate':
-                score = self.hit_rate_at_k(relevant_items, predicted_items, k)
-            else:
-                raise ValueError(f"Unknown ranking metric: {metric}")
-
-            scores.append(score)
-
-        return np.mean(scores) if scores else 0.0
+            scores[n_scored] = metric_fn(relevant_items, precomputed_topk[user_id][:k], k)
+            n_scored += 1
+
+        return scores[:n_scored].mean() if n_scored else 0.0
 
 
 # Test the metrics
@@ -0,0 +1,173 @@
+"""
+Pipeline Storage for the Backend API
+
+Keeps a bounded number of pipelines (datasets + trained models) in memory
+and spills every pipeline to disk so memory stays bounded and pipelines
+survive a process restart. Every save writes a new version token, so
+worker processes sharing the cache directory reload a pipeline another
+worker has changed instead of serving their stale in-memory copy. Pipelines left idle longer than a TTL are
+deleted so the store does not grow without bound.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+
+class PipelineStore:
+    """
+    Dict-like pipeline registry with an in-memory LRU backed by joblib files
+
+    Parameters:
+    -----------
+    cache_dir : path where pipelines are written as {pipeline_id}.joblib
+    max_in_memory : number of most recently used pipelines kept in memory
+    ttl : seconds a pipeline may sit unused before it is deleted (None keeps
+        pipelines forever)
+
+    The file modification time records the last access, so the TTL is shared
+    by every worker process using the same cache_dir. Expired pipelines leave
+    an empty {pipeline_id}.expired marker so callers can tell them apart from
+    ids that never existed. {pipeline_id}.version holds a token rewritten on
+    every save; an in-memory copy is only served while its token matches.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_in_memory: int = 8,
+                 ttl: Optional[float] = 3600):
+        self.cache_dir = Path(cache_dir or Path(__file__).parent.parent / 'cache')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_in_memory = max_in_memory
+        self.ttl = ttl
+
+        # pipeline_id -> (pipeline, version token it was loaded or saved at)
+        self._hot: 'OrderedDict[str, Tuple[Dict[str, Any], Optional[str]]]' = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _path(self, pipeline_id: str) -> Path:
+        return self.cache_dir / f"{pipeline_id}.joblib"
+
+    def _marker(self, pipeline_id: str) -> Path:
+        return self.cache_dir / f"{pipeline_id}.expired"
+
+    def _version_path(self, pipeline_id: str) -> Path:
+        return self.cache_dir / f"{pipeline_id}.version"
+
+    def _version(self, pipeline_id: str) -> Optional[str]:
+        try:
+            return self._version_path(pipeline_id).read_text()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _replace(path: Path, write) -> None:
+        """Write to a unique temp file and rename it over path, so readers never see a partial file"""
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _is_stale(self, path: Path) -> bool:
+        try:
+            return self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl
+        except FileNotFoundError:
+            return False
+
+    def _expire(self, pipeline_id: str) -> None:
+        """Drop a pipeline from memory and disk, leaving an expiry marker"""
+        self._hot.pop(pipeline_id, None)
+        self._path(pipeline_id).unlink(missing_ok=True)
+        self._version_path(pipeline_id).unlink(missing_ok=True)
+        self._marker(pipeline_id).touch()
+
+    def _live(self, pipeline_id: str) -> bool:
+        """True if the pipeline exists and has not outlived the TTL"""
+        path = self._path(pipeline_id)
+        if not path.exists():
+            self._hot.pop(pipeline_id, None)
+            return False
+        if self._is_stale(path):
+            self._expire(pipeline_id)
+            return False
+        return True
+
+    def _remember(self, pipeline_id: str, pipeline: Dict[str, Any], version: Optional[str]) -> None:
+        """Mark a pipeline as most recently used, evicting the oldest if needed"""
+        self._hot[pipeline_id] = (pipeline, version)
+        self._hot.move_to_end(pipeline_id)
+        while len(self._hot) > self.max_in_memory:
+            self._hot.popitem(last=False)
+
+    def __contains__(self, pipeline_id: object) -> bool:
+        if not isinstance(pipeline_id, str):
+            return False
+        with self._lock:
+            return self._live(pipeline_id)
+
+    def __getitem__(self, pipeline_id: str) -> Dict[str, Any]:
+        with self._lock:
+            if not self._live(pipeline_id):
+                raise KeyError(pipeline_id)
+
+            path = self._path(pipeline_id)
+            os.utime(path)
+
+            # Serve the in-memory copy only if no other worker has saved since
+            version = self._version(pipeline_id)
+            hot = self._hot.get(pipeline_id)
+            if hot is not None and hot[1] == version:
+                self._hot.move_to_end(pipeline_id)
+                return hot[0]
+
+            # Memory-map the stored arrays so only touched pages are read
+            pipeline = joblib.load(path, mmap_mode='r')
+            self._remember(pipeline_id, pipeline, version)
+            return pipeline
+
+    def __setitem__(self, pipeline_id: str, pipeline: Dict[str, Any]) -> None:
+        with self._lock:
+            version = uuid.uuid4().hex
+            self._replace(self._path(pipeline_id), lambda tmp: joblib.dump(pipeline, tmp))
+            self._replace(self._version_path(pipeline_id), lambda tmp: tmp.write_text(version))
+            self._remember(pipeline_id, pipeline, version)
+            self.expire_idle()
+
+    def __len__(self) -> int:
+        return len(list(self.cache_dir.glob('*.joblib')))
+
+    def is_expired(self, pipeline_id: str) -> bool:
+        """True if the pipeline existed but was deleted after sitting idle"""
+        return self._marker(pipeline_id).exists()
+
+    def expire_idle(self) -> None:
+        """Delete every pipeline that has been idle longer than the TTL"""
+        if self.ttl is None:
+            return
+        with self._lock:
+            for path in self.cache_dir.glob('*.joblib'):
+                if self._is_stale(path):
+                    self._expire(path.stem)
+
+    def update(self, pipeline_id: str, **fields: Any) -> None:
+        """
+        Set fields on a pipeline and persist it
+
+        The fields are merged into the latest saved version (reloaded if
+        another worker saved since this one read it), so concurrent workers
+        writing different fields do not overwrite each other's results.
+        """
+        with self._lock:
+            pipeline = dict(self[pipeline_id])
+            pipeline.update(fields)
+            self[pipeline_id] = pipeline
+
+    def save(self, pipeline_id: str) -> None:
+        """Persist changes made to a pipeline dict returned by this store"""
+        self[pipeline_id] = self[pipeline_id]
@@ -0,0 +1,93 @@
+"""
+Request Coalescing for Top-K Predictions
+
+Tree models pay a fixed cost per predict call (feature matrix and DMatrix
+construction), so predicting 50 users in one call is much cheaper than
+50 single-user calls. PredictionBatcher collects concurrent predict
+requests for the same model over a short window and serves them with a
+single model.predict call.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+
+class PredictionBatcher:
+    """
+    Merge concurrent model.predict(user_ids, top_k) calls into one
+
+    Parameters:
+    -----------
+    max_batch : maximum number of requests merged into a single call
+    max_wait : seconds to wait for more requests after the first arrives
+    """
+
+    def __init__(self, max_batch: int = 64, max_wait: float = 0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._queue: 'queue.Queue[Tuple[Any, List[Any], int, Future]]' = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def predict(self, model, user_ids: List[Any], top_k: int) -> Dict[Any, Any]:
+        """Queue a request and block until its slice of the batched result is ready"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((model, list(user_ids), top_k, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[Any, List[Any], int, Future]]:
+        """Take the next request plus whatever arrives within max_wait"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+
+            # Only requests against the same model with the same top_k can share a call
+            groups: Dict[Tuple[int, int], List[Tuple[Any, List[Any], int, Future]]] = {}
+            for request in batch:
+                model, _, top_k, _ = request
+                groups.setdefault((id(model), top_k), []).append(request)
+
+            for requests in groups.values():
+                model, _, top_k, _ = requests[0]
+                try:
+                    merged_users = list(dict.fromkeys(
+                        user_id for _, user_ids, _, _ in requests for user_id in user_ids
+                    ))
+                    predictions = model.predict(merged_users, top_k=top_k)
+                except Exception as e:
+                    for _, _, _, future in requests:
+                        future.set_exception(e)
+                    continue
+
+                # A failure for one request (e.g. a missing user) must not kill
+                # the worker thread and strand every other waiting future
+                for _, user_ids, _, future in requests:
+                    try:
+                        future.set_result({user_id: predictions[user_id] for user_id in user_ids})
+                    except Exception as e:
+                        future.set_exception(e)
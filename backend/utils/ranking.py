@@ -0,0 +1,203 @@
+"""
+Top-K Ranking Helpers
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+class LazyScores:
+    """
+    Read-only users x items score matrix computed on access
+
+    Subclasses set shape and implement score_rows / score_pairs; indexing
+    supports the two lookups the blocks need without materializing the
+    matrix: scores[rows] for whole rows and scores[rows, cols] for paired
+    (user, item) index arrays.
+    """
+
+    shape: Tuple[int, int]
+
+    def score_rows(self, rows) -> np.ndarray:
+        raise NotImplementedError
+
+    def score_pairs(self, rows, cols) -> np.ndarray:
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.score_pairs(*key)
+        return self.score_rows(key)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first
+
+    Partitions out the top k in O(n) and sorts only those k entries instead
+    of sorting every score. Works on a 1-D score vector or row-wise on a
+    2-D (users x items) score matrix.
+
+    Parameters:
+    -----------
+    scores : 1-D or 2-D array of scores
+    k : number of indices to return (clipped to the number of items)
+
+    Returns:
+    --------
+    indices : array of shape (k,) or (n_rows, k)
+    """
+    scores = np.asarray(scores)
+    n_items = scores.shape[-1]
+    k = min(k, n_items)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k < n_items:
+        part = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    else:
+        part = np.broadcast_to(np.arange(n_items), scores.shape).copy()
+
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def top_k_indices_sparse(scores, k: int) -> np.ndarray:
+    """
+    Row-wise top_k_indices for a scipy CSR score matrix without densifying it
+
+    Missing entries score zero. When a row stores at least k positive
+    scores its top k are among them, so only that row's stored slice is
+    partitioned; rows with fewer positives are densified one at a time to
+    fill the remainder exactly as the dense version would.
+
+    Parameters:
+    -----------
+    scores : scipy.sparse CSR matrix of shape (n_rows, n_items)
+    k : number of indices per row (clipped to the number of items)
+
+    Returns:
+    --------
+    indices : array of shape (n_rows, k)
+    """
+    scores = scores.tocsr()
+    n_rows, n_items = scores.shape
+    k = min(k, n_items)
+    top = np.empty((n_rows, k), dtype=np.int64)
+
+    indptr, indices, data = scores.indptr, scores.indices, scores.data
+    for row in range(n_rows):
+        start, end = indptr[row], indptr[row + 1]
+        row_data = data[start:end]
+        if np.count_nonzero(row_data > 0) >= k:
+            top[row] = indices[start:end][top_k_indices(row_data, k)]
+        else:
+            top[row] = top_k_indices(scores[row].toarray().ravel(), k)
+
+    return top
+
+
+def _top_k_heap(scores, k):
+    """
+    Row-wise top k by a k-sized min-heap, best first
+
+    One pass per row with O(k) scratch instead of argpartition's full-row
+    copy. Ties prefer the lower item index.
+    """
+    n_rows, n_items = scores.shape
+    top_idx = np.empty((n_rows, k), dtype=np.int64)
+    top_val = np.empty((n_rows, k), dtype=scores.dtype)
+    heap_val = np.empty(k, dtype=scores.dtype)
+    heap_idx = np.empty(k, dtype=np.int64)
+
+    for row in range(n_rows):
+        size = 0
+        for j in range(n_items):
+            v = scores[row, j]
+            if size < k:
+                # Sift the new entry up from the end
+                pos = size
+                size += 1
+                while pos > 0:
+                    parent = (pos - 1) // 2
+                    pv = heap_val[parent]
+                    if pv < v or (pv == v and heap_idx[parent] > j):
+                        break
+                    heap_val[pos] = pv
+                    heap_idx[pos] = heap_idx[parent]
+                    pos = parent
+                heap_val[pos] = v
+                heap_idx[pos] = j
+            elif v > heap_val[0]:
+                # Replace the smallest kept score and sift it down
+                _sift_down(heap_val, heap_idx, 0, size, v, j)
+
+        # Pop the minimum repeatedly, filling the output from the back
+        for t in range(k - 1, -1, -1):
+            top_val[row, t] = heap_val[0]
+            top_idx[row, t] = heap_idx[0]
+            size -= 1
+            if size > 0:
+                _sift_down(heap_val, heap_idx, 0, size, heap_val[size], heap_idx[size])
+
+    return top_idx, top_val
+
+
+def _sift_down(heap_val, heap_idx, pos, size, v, j):
+    """Place (v, j) at pos and sift it down a min-heap of the given size"""
+    while True:
+        child = 2 * pos + 1
+        if child >= size:
+            break
+        right = child + 1
+        if right < size and (
+            heap_val[right] < heap_val[child]
+            or (heap_val[right] == heap_val[child] and heap_idx[right] > heap_idx[child])
+        ):
+            child = right
+        cv = heap_val[child]
+        if v < cv or (v == cv and j > heap_idx[child]):
+            break
+        heap_val[pos] = cv
+        heap_idx[pos] = heap_idx[child]
+        pos = child
+    heap_val[pos] = v
+    heap_idx[pos] = j
+
+
+if NUMBA_AVAILABLE:
+    _sift_down = njit(cache=True)(_sift_down)
+    _top_k_heap = njit(cache=True)(_top_k_heap)
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise top k indices and their scores, best first
+
+    Uses a compiled k-sized heap per row when Numba is installed, which
+    beats argpartition for small k over wide rows; otherwise falls back to
+    top_k_indices.
+
+    Parameters:
+    -----------
+    scores : 2-D array of scores (n_rows x n_items)
+    k : number of items per row (clipped to the number of items)
+
+    Returns:
+    --------
+    indices, values : arrays of shape (n_rows, k)
+    """
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[1])
+    if NUMBA_AVAILABLE and k > 0:
+        return _top_k_heap(np.ascontiguousarray(scores), k)
+
+    indices = top_k_indices(scores, k)
+    return indices, np.take_along_axis(scores, indices, axis=1)